@@ -0,0 +1,287 @@
+"""Benchmarks for the XBM scan, decode, patch and redraw paths.
+
+Synthetic XBM-like files are generated in a temporary directory with the
+IlluminationColor1 parameter placed at the start, middle or end of a
+filler block, so scan cost can be compared across sizes and placements.
+
+    python benchmarks/bench_xbm.py                      # run and print
+    python benchmarks/bench_xbm.py --save-baseline      # store benchmarks/baseline.json
+    python benchmarks/bench_xbm.py --compare            # diff against the stored baseline
+    python benchmarks/bench_xbm.py --quick              # smaller corpora
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from xbm_batch import run_batch  # noqa: E402
+from xbm_core import (XbmMaterial, find_color_parameters, find_illumination_color,  # noqa: E402
+                      find_parameter, patch_file_in_place, read_rgba, scan_stream)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SIZES = [1024, 64 * 1024, 1024 * 1024, 16 * 1024 * 1024]
+QUICK_SIZES = [1024, 64 * 1024, 1024 * 1024]
+PLACEMENTS = ('start', 'middle', 'end')
+
+
+def make_parameter(name, value):
+    """A length-prefixed, NUL-terminated parameter name followed by its value"""
+    return bytes([len(name)]) + name.encode('ascii') + b'\x00' + value
+
+
+def make_xbm(size, placement='middle', extra_colors=2, seed=0):
+    """Build a synthetic XBM-like buffer of roughly size bytes"""
+    rng = random.Random(seed)
+    params = [make_parameter("DiffuseTexture", b"textures/bench_diffuse.xbt\x00"),
+              make_parameter("SpecularPower", struct.pack('<f', 16.0))]
+    for i in range(extra_colors):
+        params.append(make_parameter(f"TintColor{i}", struct.pack('<4f', 0.2, 0.4, 0.6, 1.0)))
+    illumination = make_parameter("IlluminationColor1", struct.pack('<4f', 0.5, 0.8, 2.5, 1.0))
+
+    header = b"MTRL" + struct.pack('<I', size)
+    block = b"".join(params)
+    filler_size = max(0, size - len(header) - len(block) - len(illumination))
+    # Printable-free filler so the scanners do real work without false hits
+    filler = bytes(rng.randrange(0x80, 0x100) for _ in range(min(filler_size, 4096)))
+    filler = (filler * (filler_size // max(len(filler), 1) + 1))[:filler_size]
+
+    if placement == 'start':
+        return header + illumination + block + filler
+    if placement == 'end':
+        return header + block + filler + illumination
+    half = filler_size // 2
+    return header + block + filler[:half] + illumination + filler[half:]
+
+
+def timeit(func, min_time=0.2, max_runs=1000):
+    """Best-of runs timing in seconds"""
+    best = float('inf')
+    runs = 0
+    start = time.perf_counter()
+    while runs < max_runs and (runs < 3 or time.perf_counter() - start < min_time):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+        runs += 1
+    return best
+
+
+def bench_single_file(sizes):
+    """Scan and decode cost per file size and parameter placement"""
+    results = {}
+    for size in sizes:
+        for placement in PLACEMENTS:
+            data = bytearray(make_xbm(size, placement))
+            mb = len(data) / (1024 * 1024)
+            pos = find_illumination_color(data)
+            key = f"{size // 1024}KB/{placement}"
+            timings = {
+                'find_illumination_color': timeit(lambda: find_illumination_color(data)),
+                'find_color_parameters': timeit(lambda: find_color_parameters(data)),
+                'find_parameter': timeit(lambda: find_parameter(data, 'IlluminationColor1')),
+                'decode_rgba': timeit(lambda: read_rgba(data, pos)),
+                'material_open': timeit(lambda: XbmMaterial(data)),
+                'scan_stream': timeit(lambda: list(scan_stream(io.BytesIO(data), chunk_size=256 * 1024))),
+            }
+            results[key] = {name: {'ms': t * 1000, 'mb_per_s': mb / t if t else 0.0}
+                            for name, t in timings.items()}
+    return results
+
+
+def bench_patch(workdir, sizes):
+    """Full rewrite (save_file path) versus memory-mapped in-place patch"""
+    results = {}
+    for size in sizes:
+        path = os.path.join(workdir, f"patch_{size}.xbm")
+        with open(path, 'wb') as f:
+            f.write(make_xbm(size))
+        material = XbmMaterial.load(path)
+
+        def full_write():
+            material.set_color((1.0, 0.5, 0.25, 1.0))
+            material.save(path)
+
+        def mmap_patch():
+            patch_file_in_place(path, rgba=(1.0, 0.5, 0.25, 1.0))
+
+        results[f"{size // 1024}KB"] = {
+            'full_rewrite_ms': timeit(full_write) * 1000,
+            'mmap_patch_ms': timeit(mmap_patch) * 1000,
+        }
+    return results
+
+
+def bench_bulk(workdir, file_count, file_size, workers):
+    """Files/s and MB/s for a whole-tree patch through run_batch"""
+    corpus = os.path.join(workdir, "corpus")
+    os.makedirs(corpus, exist_ok=True)
+    template = make_xbm(file_size, 'middle')
+    paths = []
+    for i in range(file_count):
+        sub = os.path.join(corpus, f"dir{i % 16:02d}")
+        os.makedirs(sub, exist_ok=True)
+        path = os.path.join(sub, f"material_{i:05d}.xbm")
+        with open(path, 'wb') as f:
+            f.write(template)
+        paths.append(path)
+
+    total_mb = file_count * len(template) / (1024 * 1024)
+    results = {}
+    for label, options in (('rewrite', {'scale': 1.0}),
+                           ('mmap', {'scale': 1.0, 'in_place': True})):
+        for worker_count in workers:
+            jobs = [(path, None, False, options) for path in paths]
+            start = time.perf_counter()
+            for result in run_batch(jobs, workers=worker_count):
+                if result.status == 'error':
+                    raise RuntimeError(result.error)
+            elapsed = time.perf_counter() - start
+            results[f"{label}/j{worker_count}"] = {
+                'seconds': elapsed,
+                'files_per_s': file_count / elapsed,
+                'mb_per_s': total_mb / elapsed,
+            }
+    return results
+
+
+def bench_redraw(iterations=200):
+    """Latency of update_color_displays / on_color_change on a withdrawn Tk window"""
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:
+        return {'skipped': f"no display available ({e})"}
+
+    os.environ['XBM_EDITOR_NO_IMAGES'] = '1'
+    try:
+        from xbm_editor import ModernXBMEditor
+        root.withdraw()
+        editor = ModernXBMEditor(root)
+        rng = random.Random(1)
+        colors = [(rng.uniform(0, 3), rng.uniform(0, 3), rng.uniform(0, 3)) for _ in range(iterations)]
+
+        def run_displays():
+            for r, g, b in colors:
+                editor.update_color_displays(r, g, b)
+            root.update_idletasks()
+
+        def run_color_change():
+            for r, g, b in colors:
+                editor.color_vars['red'].set(r)
+                editor.color_vars['green'].set(g)
+                editor.color_vars['blue'].set(b)
+                editor.on_color_change()
+            root.update_idletasks()
+
+        return {
+            'update_color_displays_us': timeit(run_displays, max_runs=20) / iterations * 1e6,
+            'on_color_change_us': timeit(run_color_change, max_runs=20) / iterations * 1e6,
+        }
+    finally:
+        root.destroy()
+
+
+def cpu_name():
+    """Best-effort CPU model string for the results metadata"""
+    try:
+        with open('/proc/cpuinfo', 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def run(args):
+    sizes = QUICK_SIZES if args.quick else SIZES
+    workers = sorted(set([1, args.jobs or (os.cpu_count() or 1)]))
+    workdir = tempfile.mkdtemp(prefix="xbm_bench_")
+    try:
+        return {
+            'meta': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu': cpu_name(),
+                'cpu_count': os.cpu_count(),
+                'quick': args.quick,
+            },
+            'single_file': bench_single_file(sizes),
+            'patch': bench_patch(workdir, sizes),
+            'bulk': bench_bulk(workdir, args.files, args.file_size, workers),
+            'redraw': bench_redraw() if not args.no_redraw else {'skipped': 'disabled'},
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def flatten(results, prefix=""):
+    """Flatten nested results into 'a/b/c' -> number"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}/{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(current, baseline):
+    """Print metrics that moved by more than 10% against the baseline"""
+    current_flat = flatten({k: v for k, v in current.items() if k != 'meta'})
+    baseline_flat = flatten({k: v for k, v in baseline.items() if k != 'meta'})
+    meta = baseline.get('meta', {})
+    print(f"\nBaseline measured on {meta.get('cpu', '?')} x{meta.get('cpu_count', '?')}, "
+          f"{meta.get('platform', '?')}, Python {meta.get('python', '?')}")
+    print(f"\n{'Metric':<70}{'Baseline':>12}{'Current':>12}{'Change':>9}")
+    for name in sorted(current_flat):
+        if name not in baseline_flat or not baseline_flat[name]:
+            continue
+        old, new = baseline_flat[name], current_flat[name]
+        change = (new - old) / old * 100
+        if abs(change) >= 10:
+            print(f"{name:<70}{old:>12.3f}{new:>12.3f}{change:>+8.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark XBM scan, decode, patch and redraw paths")
+    parser.add_argument("--quick", action="store_true", help="Skip the 16 MB files")
+    parser.add_argument("--files", type=int, default=2000, help="Files in the bulk corpus (default: 2000)")
+    parser.add_argument("--file-size", type=int, default=8192, help="Bulk corpus file size in bytes")
+    parser.add_argument("-j", "--jobs", type=int, default=0, help="Workers for the bulk run (default: one per CPU)")
+    parser.add_argument("--no-redraw", action="store_true", help="Skip the Tk redraw benchmark")
+    parser.add_argument("--save-baseline", nargs="?", const=BASELINE_PATH, metavar="PATH",
+                        help="Store the results as the baseline")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_PATH, metavar="PATH",
+                        help="Compare the results with a stored baseline")
+    parser.add_argument("-o", "--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
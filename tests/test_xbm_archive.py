@@ -0,0 +1,70 @@
+import struct
+import zlib
+
+import xbm_archive
+from xbm_archive import (COMPRESSION_ZLIB, FAT_MAGIC, HEADER, ArchiveEntry, DuniaArchive,
+                         encode_entry, name_hash)
+from xbm_batch import main
+
+NAME = 'graphics\\creatures\\viperwolf.xbm'
+
+
+def make_material(rgba=(0.5, 0.5, 0.5, 1.0)):
+    return b'\x00Params\x00IlluminationColor1\x00' + struct.pack('<4f', *rgba) + b'\x00' * 64
+
+
+def make_archive(tmp_path, materials):
+    """patch.fat/.dat/.filelist holding zlib entries; a None blob is stored as garbage"""
+    fat = HEADER.pack(FAT_MAGIC, 5, 0, len(materials))
+    dat = b''
+    for index, (name, material) in enumerate(materials):
+        blob = zlib.compress(material, 9) if material is not None else b'not zlib data'
+        size = len(material) if material is not None else 100
+        fat += encode_entry(ArchiveEntry(index, name_hash(name), len(dat), size, len(blob), COMPRESSION_ZLIB))
+        dat += blob
+    fat_path = tmp_path / 'patch.fat'
+    fat_path.write_bytes(fat)
+    (tmp_path / 'patch.dat').write_bytes(dat)
+    (tmp_path / 'patch.filelist').write_text(''.join(name + '\n' for name, material in materials))
+    return fat_path, dat
+
+
+def test_compressed_entry_is_appended_and_old_data_kept(tmp_path):
+    material = make_material()
+    fat_path, old_dat = make_archive(tmp_path, [(NAME, material)])
+
+    with DuniaArchive(str(fat_path), cache_dir=None) as archive:
+        # The new stream is no larger than the old one, which used to be overwritten in place
+        assert archive.patch_color(archive.find(NAME), rgba=(0.5, 0.5, 0.5, 1.0)) is not None
+
+    dat = (tmp_path / 'patch.dat').read_bytes()
+    assert dat.startswith(old_dat)
+    with DuniaArchive(str(fat_path), cache_dir=None) as archive:
+        entry = archive.find(NAME)
+        assert entry.offset == len(old_dat)
+        assert archive.read_entry(entry) == material
+
+
+def test_batch_rewrites_fat_once_and_reports_unreadable_entries(tmp_path, monkeypatch, capsys):
+    names = [f'graphics\\m{i}.xbm' for i in range(20)]
+    fat_path, old_dat = make_archive(tmp_path, [(name, make_material()) for name in names]
+                                     + [('graphics\\broken.xbm', None)])
+    fat_writes = []
+    real_atomic_write = xbm_archive.atomic_write
+
+    def counting_atomic_write(path, data):
+        fat_writes.append(path)
+        real_atomic_write(path, data)
+
+    monkeypatch.setattr(xbm_archive, 'atomic_write', counting_atomic_write)
+    assert main([str(fat_path), '--scale', '2']) == 1
+    out, err = capsys.readouterr()
+
+    assert fat_writes.count(str(fat_path)) == 1
+    assert "20 colors patched, 0 skipped, 1 errors" in out
+    assert 'broken.xbm' in err
+    with DuniaArchive(str(fat_path), cache_dir=None) as archive:
+        for name in names:
+            entry = archive.find(name)
+            assert entry.offset >= len(old_dat)
+            assert archive.read_entry(entry) == make_material((1.0, 1.0, 1.0, 1.0))
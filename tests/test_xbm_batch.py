@@ -0,0 +1,30 @@
+import struct
+
+import xbm_batch
+from xbm_cache import ScanCache
+from xbm_core import read_rgba
+
+
+def test_run_batch_without_jobs_starts_no_pool(monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("process pool started with nothing to run")
+
+    monkeypatch.setattr(xbm_batch, 'ProcessPoolExecutor', no_pool)
+    assert list(xbm_batch.run_batch([], workers=4)) == []
+    assert list(xbm_batch.run_batch(iter(()), workers=4, job_func=xbm_batch._scan_job)) == []
+
+
+def test_cached_batch_stores_patched_files(tmp_path, capsys):
+    color = struct.pack('<4f', 0.5, 0.25, 1.0, 1.0)
+    (tmp_path / 'a.xbm').write_bytes(b'\x00Mask\x00IlluminationColor1\x00' + color + b'\x00' * 32)
+    (tmp_path / 'b.xbm').write_bytes(b'\x00Mask\x00' + b'\x00' * 32)
+    db = str(tmp_path / 'cache.db')
+
+    for expected in ("cache: 0 hits, 2 misses", "cache: 2 hits, 0 misses"):
+        assert xbm_batch.main([str(tmp_path), '--scale', '2', '--cache', db, '-q']) == 0
+        assert expected in capsys.readouterr().out
+
+    with ScanCache(db) as cache:
+        record = cache.lookup(str(tmp_path / 'a.xbm'))
+    assert record.rgba == (2.0, 1.0, 4.0, 1.0)
+    assert record.rgba == read_rgba((tmp_path / 'a.xbm').read_bytes(), record.position)
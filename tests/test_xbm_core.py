@@ -0,0 +1,57 @@
+import struct
+
+from xbm_core import _classify_value, find_parameter, locate_illumination_color
+
+
+def rgba_bytes(*rgba):
+    return struct.pack('<4f', *rgba)
+
+
+def test_hdr_color_with_printable_leading_bytes_is_float4():
+    # 3.3 is stored as b'33S@', which looks like the start of a string
+    value = rgba_bytes(3.3, 1.0, 1.0, 1.0)
+    assert value.startswith(b'33S@\x00')
+    assert _classify_value('IlluminationColor1', value) == ('float4', 16)
+
+
+def test_hdr_color_is_found_by_name_search():
+    data = b'\x05Shader\x00fx.fx\x00IlluminationColor1\x00' + rgba_bytes(3.3, 1.0, 1.0, 1.0) + b'Next\x00'
+    offset = data.index(b'IlluminationColor1\x00') + len(b'IlluminationColor1\x00')
+    assert find_parameter(data, 'IlluminationColor1') == offset
+    assert locate_illumination_color(data) == offset
+
+
+def test_text_values_stay_strings():
+    assert _classify_value('DiffuseTexture', b'textures/abc.dd\x00') == ('string', 16)
+    assert _classify_value('Shader', b'fx.fx\x00') == ('string', 6)
+
+
+def test_stream_scan_finds_hdr_color_across_chunk_sizes():
+    import io
+    from xbm_core import scan_stream
+
+    color = rgba_bytes(3.3, 1.0, 1.0, 1.0)
+    blob = b'\x00' * 20 + b'IlluminationColor1\x00' + color + b'\x00' * 40
+    expected = [(20 + len(b'IlluminationColor1\x00'), struct.unpack('<4f', color))]
+    for chunk_size in (7, 16, 64, 1024):
+        hits = list(scan_stream(io.BytesIO(blob), chunk_size=chunk_size, whole_name=True))
+        assert hits == expected, chunk_size
+
+
+def test_color_scan_skips_texture_maps_and_paths(tmp_path):
+    from xbm_batch import main
+    from xbm_core import find_color_parameters
+
+    texture = b'DiffuseColorMap\x00textures/creature_diffuse.dds\x00'
+    path_hit = b'Mask\x00textures/a_IlluminationColor1\x00'
+    color = b'DiffuseColor\x00' + rgba_bytes(0.5, 0.25, 1.0, 1.0)
+    data = b'\x00' + texture + path_hit + color + b'End\x00'
+    offset = data.index(color) + len(b'DiffuseColor\x00')
+    assert find_color_parameters(data) == [('DiffuseColor', offset)]
+
+    material = tmp_path / 'fp.xbm'
+    material.write_bytes(data)
+    assert main([str(material), '-p', '*Color*', '--scale', '2', '--mmap', '-q']) == 0
+    patched = material.read_bytes()
+    assert patched.startswith(b'\x00' + texture + path_hit)
+    assert struct.unpack_from('<4f', patched, offset) == (1.0, 0.5, 2.0, 1.0)
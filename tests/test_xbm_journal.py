@@ -0,0 +1,73 @@
+import struct
+
+from xbm_batch import main
+from xbm_core import read_rgba
+from xbm_journal import Journal, read_journal, rollback
+
+HEADER = b'\x00Mask\x00IlluminationColor1\x00'
+POSITION = len(HEADER)
+
+
+def write_material(path, rgba):
+    path.write_bytes(HEADER + struct.pack('<4f', *rgba) + b'\x00' * 32)
+
+
+def journal_of(tmp_path, changes):
+    """A journal recording (path, old_rgba, new_rgba) color changes"""
+    journal_path = tmp_path / 'batch.jsonl'
+    with Journal(str(journal_path), description="test") as journal:
+        for path, old_rgba, new_rgba in changes:
+            journal.record_colors(str(path), [('IlluminationColor1', POSITION, old_rgba, new_rgba)])
+    return journal_path
+
+
+def test_rollback_restored_unchanged_and_conflict(tmp_path):
+    old, new, other = (0.5, 0.5, 0.5, 1.0), (1.0, 1.0, 1.0, 1.0), (0.25, 0.0, 0.0, 1.0)
+    patched, never_written, edited_since = (tmp_path / name for name in ('a.xbm', 'b.xbm', 'c.xbm'))
+    write_material(patched, new)
+    write_material(never_written, old)
+    write_material(edited_since, other)
+    journal_path = journal_of(tmp_path, [(path, old, new) for path in (patched, never_written, edited_since)])
+
+    statuses = {result.path: result.status for result in rollback(str(journal_path))}
+    assert statuses == {str(patched): 'restored', str(never_written): 'unchanged',
+                        str(edited_since): 'conflict'}
+    assert read_rgba(patched.read_bytes(), POSITION) == old
+    assert read_rgba(never_written.read_bytes(), POSITION) == old
+    assert read_rgba(edited_since.read_bytes(), POSITION) == other
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    old, new = (0.5, 0.5, 0.5, 1.0), (1.0, 1.0, 1.0, 1.0)
+    first, second = tmp_path / 'a.xbm', tmp_path / 'b.xbm'
+    write_material(first, new)
+    write_material(second, new)
+    journal_path = journal_of(tmp_path, [(first, old, new), (second, old, new)])
+    data = journal_path.read_bytes()
+    journal_path.write_bytes(data[:-20])  # Interrupted mid-way through the last entry
+
+    header, entries = read_journal(str(journal_path))
+    assert header['description'] == "test"
+    assert [entry['path'] for entry in entries] == [str(first)]
+    assert [result.status for result in rollback(str(journal_path))] == ['restored']
+    assert read_rgba(second.read_bytes(), POSITION) == new
+
+
+def test_journal_and_rollback_round_trip(tmp_path, capsys):
+    originals = {}
+    for i in range(3):
+        path = tmp_path / f'm{i}.xbm'
+        write_material(path, (0.1 * (i + 1), 0.5, 0.25, 1.0))
+        originals[path] = path.read_bytes()
+    (tmp_path / 'plain.xbm').write_bytes(b'\x00Mask\x00' + b'\x00' * 32)
+    journal_path = tmp_path / 'journals' / 'batch.jsonl'
+
+    assert main([str(tmp_path), '--scale', '2', '--mmap', '--journal', str(journal_path), '-q']) == 0
+    for path, data in originals.items():
+        assert path.read_bytes() != data
+    assert len(read_journal(str(journal_path))[1]) == 3
+
+    assert main(['--rollback', str(journal_path)]) == 0
+    assert "3 restored, 0 already original, 0 conflicts" in capsys.readouterr().out
+    for path, data in originals.items():
+        assert path.read_bytes() == data
@@ -0,0 +1,19 @@
+from xbm_library import ColorIndex, make_entry
+
+
+def make_index():
+    index = ColorIndex()
+    for name, rgb in (('red', (1.0, 0.0, 0.0)), ('green', (0.0, 1.0, 0.0)), ('blue', (0.0, 0.0, 1.0))):
+        index.add(make_entry(name, rgb + (1.0,)))
+    return index
+
+
+def query_names(index, **filters):
+    return [entry.path for entry in index.query(**filters)]
+
+
+def test_hue_filter_with_one_bound():
+    index = make_index()
+    assert query_names(index, hue_min=100) == ['green', 'blue']
+    assert query_names(index, hue_max=180) == ['red', 'green']
+    assert query_names(index, hue_min=330, hue_max=30) == ['red']
@@ -0,0 +1,15 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from xbm_preview import TONE_MAPPERS, render  # noqa: E402
+
+
+@pytest.mark.parametrize('mode', TONE_MAPPERS)
+def test_non_finite_and_huge_colors_render(mode):
+    for rgb in ((float('inf'), 1.0, 1.0), (float('nan'), 0.5, -float('inf')), (3.0e38, 1.0, 1.0)):
+        pixels = render(rgb, 64, 64, mode=mode)
+        assert pixels.shape == (64, 64, 3) and pixels.dtype == np.uint8
+    # inf is shown as the brightest red, NaN as no emission
+    assert (render((float('inf'), 0.0, 0.0), 64, 64, mode=mode) == render((1.0e4, 0.0, 0.0), 64, 64, mode=mode)).all()
+    assert (render((float('nan'), 0.0, 0.0), 64, 64, mode=mode) == render((0.0, 0.0, 0.0), 64, 64, mode=mode)).all()
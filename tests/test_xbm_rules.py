@@ -0,0 +1,36 @@
+import sys
+
+import pytest
+
+from xbm_rules import RuleError, RuleSet, load_rules
+
+
+@pytest.mark.parametrize('spec', [
+    {'when': [1], 'scale': 2},
+    {'when': {'hue': 5}, 'scale': 2},
+    {'when': {'hue': ['a', 10]}, 'scale': 2},
+    {'when': {'min_scale': '1'}, 'scale': 2},
+    {'scale': '2'},
+    {'color': [1, 0, 'x']},
+    {'alpha': True},
+    {'path': 3, 'scale': 2},
+    'scale',
+])
+def test_malformed_rules_raise_rule_error(spec):
+    with pytest.raises(RuleError):
+        RuleSet([spec])
+
+
+def test_rule_applies_to_matching_color():
+    rules = RuleSet([{'name': 'blue glow', 'when': {'dominant': 'blue', 'hue': [200, 260]}, 'scale': 2}])
+    assert rules.evaluate('a.xbm', 'IlluminationColor1', (0.2, 0.4, 1.0, 1.0)) == (0.4, 0.8, 2.0, 1.0)
+    assert rules.evaluate('a.xbm', 'IlluminationColor1', (1.0, 0.2, 0.2, 1.0)) is None
+
+
+def test_toml_without_a_parser_raises_rule_error(tmp_path, monkeypatch):
+    rules = tmp_path / 'rules.toml'
+    rules.write_text('[[rule]]\nname = "x"\nscale = 2\n')
+    monkeypatch.setitem(sys.modules, 'tomllib', None)
+    monkeypatch.setitem(sys.modules, 'tomli', None)
+    with pytest.raises(RuleError, match="tomli"):
+        load_rules(str(rules))
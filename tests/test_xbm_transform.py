@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+from xbm_transform import TransformPipeline, parse_operation  # noqa: E402
+
+
+@pytest.mark.parametrize('spec', ['scale', 'tint:1', 'tint:1,0,0', 'tint:1,0:0.5', 'clamp:4:0',
+                                  'hue:abc', 'normalize:1', 'scale:1,2'])
+def test_bad_operations_raise_value_error(spec):
+    with pytest.raises(ValueError):
+        parse_operation(spec)
+
+
+def test_valid_operations_apply():
+    pipeline = TransformPipeline(['tint:1,0,0:1', 'scale:2', 'clamp:0:1.5'])
+    assert pipeline.apply([(0.5, 0.5, 0.5, 1.0)]).tolist() == [[1.0, 0.0, 0.0, 1.0]]
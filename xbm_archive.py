@@ -0,0 +1,383 @@
+"""Read and patch materials inside Dunia engine .fat/.dat archives.
+
+A .fat file indexes its .dat sibling: a FAT2 header followed by one 16-byte
+entry per packed file holding the CRC32 of the file's lowercased path, its
+offset in the .dat, its compressed and uncompressed sizes and the
+compression scheme. Paths are not stored, so names come from a file list
+(one path per line, e.g. "graphics\\creatures\\viperwolf.xbm"); a list named
+like the archive (patch.filelist next to patch.fat) is picked up
+automatically. Entries without a known name are shown as their hash.
+
+The parsed index and the IlluminationColor1 scan of each entry are cached
+between runs while the .fat and .dat are unchanged. Uncompressed entries
+are patched in place (only the 16 color bytes are written). Compressed
+entries are recompressed and appended to the .dat, and only then is their
+.fat entry repointed (the .fat is replaced atomically), so the live data
+is never overwritten; the old copy stays behind as unused space.
+"""
+import fnmatch
+import hashlib
+import json
+import os
+import struct
+import zlib
+from collections import namedtuple
+
+from xbm_core import RGBA_SIZE, XbmMaterial, atomic_write, locate_illumination_color, read_rgba, write_rgba
+
+FAT_MAGIC = 0x46415432  # 'FAT2'
+SUPPORTED_VERSIONS = (5,)
+HEADER = struct.Struct('<IiII')  # magic, version, flags, entry count
+ENTRY = struct.Struct('<4I')
+SIZE_MASK = 0x3FFFFFFF
+
+COMPRESSION_NONE = 0
+COMPRESSION_LZO = 1
+COMPRESSION_ZLIB = 2
+
+ENTRY_SEPARATOR = '::'
+DEFAULT_INDEX_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".xbm_color_editor", "archive_index")
+INDEX_CACHE_VERSION = 1
+
+ArchiveEntry = namedtuple('ArchiveEntry', 'index name_hash offset size compressed_size compression')
+
+
+class ArchiveError(Exception):
+    """Raised for unreadable archives and entries that cannot be patched"""
+
+
+def name_hash(name):
+    """Hash of an archive path as stored in the .fat (CRC32 of the lowercased path)"""
+    return zlib.crc32(name.replace('/', '\\').lower().encode('utf-8'))
+
+
+def entry_path(fat_path, name):
+    """Display/session path of an archive entry, e.g. 'patch.fat::graphics\\a.xbm'"""
+    return f"{fat_path}{ENTRY_SEPARATOR}{name}"
+
+
+def split_entry_path(path):
+    """(fat_path, entry_name) for an entry path, or None for a regular file"""
+    fat_path, sep, name = path.partition(ENTRY_SEPARATOR)
+    if sep and name and fat_path.lower().endswith('.fat'):
+        return fat_path, name
+    return None
+
+
+def decode_entry(index, words):
+    """Unpack the four 32-bit words of a .fat entry"""
+    name_hash, a, b, c = words
+    return ArchiveEntry(index, name_hash, (b << 2) | (c >> 30), a & SIZE_MASK, c & SIZE_MASK, a >> 30)
+
+
+def encode_entry(entry):
+    """Pack an ArchiveEntry back into its 16 .fat bytes"""
+    a = (entry.compression << 30) | entry.size
+    b = entry.offset >> 2
+    c = ((entry.offset & 3) << 30) | entry.compressed_size
+    return ENTRY.pack(entry.name_hash, a, b, c)
+
+
+def parse_fat(data):
+    """Return (version, [ArchiveEntry]) from the bytes of a .fat file"""
+    if len(data) < HEADER.size:
+        raise ArchiveError("File is too small to be a .fat index")
+    magic, version, flags, count = HEADER.unpack_from(data)
+    if magic != FAT_MAGIC:
+        raise ArchiveError("Not a Dunia .fat index (bad magic)")
+    if version not in SUPPORTED_VERSIONS:
+        raise ArchiveError(f"Unsupported .fat version {version}")
+    end = HEADER.size + count * ENTRY.size
+    if len(data) < end:
+        raise ArchiveError(".fat index is truncated")
+    return version, [decode_entry(i, words)
+                     for i, words in enumerate(ENTRY.iter_unpack(data[HEADER.size:end]))]
+
+
+def _lzo():
+    try:
+        import lzo
+    except ImportError:
+        raise ArchiveError("LZO-compressed entries need the python-lzo package (pip install python-lzo)")
+    return lzo
+
+
+def decompress_entry(entry, raw):
+    if entry.compression == COMPRESSION_NONE:
+        return raw
+    if entry.compression == COMPRESSION_ZLIB:
+        return zlib.decompress(raw)
+    if entry.compression == COMPRESSION_LZO:
+        return _lzo().decompress(raw, False, entry.size)
+    raise ArchiveError(f"Unsupported compression scheme {entry.compression}")
+
+
+def compress_entry(entry, data):
+    if entry.compression == COMPRESSION_ZLIB:
+        return zlib.compress(bytes(data), 9)
+    if entry.compression == COMPRESSION_LZO:
+        return _lzo().compress(bytes(data), 1, False)
+    raise ArchiveError(f"Unsupported compression scheme {entry.compression}")
+
+
+class DuniaArchive:
+    """A .fat/.dat pair with a cached index and per-entry color scans"""
+
+    def __init__(self, fat_path, dat_path=None, filelist=None, cache_dir=DEFAULT_INDEX_CACHE_DIR):
+        self.fat_path = fat_path
+        self.dat_path = dat_path or os.path.splitext(fat_path)[0] + '.dat'
+        self.cache_dir = cache_dir
+        self.names = {}
+        self.colors = {}  # name_hash -> (position, rgba) or None when there is no color
+        self.entries = []
+        self._by_hash = {}
+
+        if filelist is None:
+            default_list = os.path.splitext(fat_path)[0] + '.filelist'
+            filelist = default_list if os.path.exists(default_list) else None
+        if filelist:
+            self.load_filelist(filelist)
+        self._load_index()
+
+    def _stamp(self):
+        fat, dat = os.stat(self.fat_path), os.stat(self.dat_path)
+        return [fat.st_size, fat.st_mtime_ns, dat.st_size, dat.st_mtime_ns]
+
+    def _cache_path(self):
+        if not self.cache_dir:
+            return None
+        key = hashlib.sha1(os.path.abspath(self.fat_path).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def _load_index(self):
+        """Use the cached index when the archive is unchanged, else parse the .fat"""
+        stamp = self._stamp()
+        cache_path = self._cache_path()
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    cached = json.load(f)
+                if cached.get('version') == INDEX_CACHE_VERSION and cached.get('stamp') == stamp:
+                    self._set_entries([ArchiveEntry(*row) for row in cached['entries']])
+                    self.colors = {int(h): (v[0], tuple(v[1])) if v else None
+                                   for h, v in cached['colors'].items()}
+                    return
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+
+        with open(self.fat_path, 'rb') as f:
+            version, entries = parse_fat(f.read())
+        self._set_entries(entries)
+        self.colors = {}
+        self.save_index()
+
+    def _set_entries(self, entries):
+        self.entries = entries
+        self._by_hash = {entry.name_hash: entry for entry in entries}
+
+    def save_index(self):
+        """Write the index and color scans to the cache (errors are ignored)"""
+        cache_path = self._cache_path()
+        if not cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            data = {'version': INDEX_CACHE_VERSION, 'stamp': self._stamp(),
+                    'entries': [list(entry) for entry in self.entries],
+                    'colors': {str(h): [v[0], list(v[1])] if v else None for h, v in self.colors.items()}}
+            atomic_write(cache_path, json.dumps(data).encode('utf-8'))
+        except OSError:
+            pass
+
+    def load_filelist(self, path):
+        """Map entry hashes to names from a file with one archive path per line"""
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                name = line.strip()
+                if name:
+                    self.names[name_hash(name)] = name
+
+    def __len__(self):
+        return len(self.entries)
+
+    def name_of(self, entry):
+        return self.names.get(entry.name_hash, f"{entry.name_hash:08x}")
+
+    def find(self, name):
+        """Entry for an archive path or an 8-digit hex hash"""
+        entry = self._by_hash.get(name_hash(name))
+        if entry is None and len(name) == 8:
+            try:
+                entry = self._by_hash.get(int(name, 16))
+            except ValueError:
+                pass
+        if entry is None:
+            raise ArchiveError(f"{name} is not in {os.path.basename(self.fat_path)}")
+        return entry
+
+    def iter_entries(self, pattern="*.xbm", include_unnamed=False):
+        """Yield (entry, name) for named entries matching pattern (and unnamed ones if asked)"""
+        for entry in self.entries:
+            name = self.names.get(entry.name_hash)
+            if name is None:
+                if include_unnamed:
+                    yield entry, f"{entry.name_hash:08x}"
+            elif fnmatch.fnmatch(name.replace('\\', '/').lower(), pattern.lower()):
+                yield entry, name
+
+    def read_entry(self, entry, dat=None):
+        """Decompressed bytes of one entry, read straight from the .dat"""
+        if dat is None:
+            with open(self.dat_path, 'rb') as f:
+                return self.read_entry(entry, f)
+        dat.seek(entry.offset)
+        raw = dat.read(entry.compressed_size)
+        if len(raw) != entry.compressed_size:
+            raise ArchiveError(f"Entry {entry.name_hash:08x} runs past the end of the .dat")
+        return decompress_entry(entry, raw)
+
+    def read_material(self, name):
+        entry = self.find(name)
+        return XbmMaterial(self.read_entry(entry), entry_path(self.fat_path, self.name_of(entry)))
+
+    def scan(self, entry, dat=None):
+        """(position, rgba) of the entry's IlluminationColor1, or None; cached"""
+        if entry.name_hash not in self.colors:
+            data = self.read_entry(entry, dat)
+            pos = locate_illumination_color(data)
+            if pos is not None and len(data) >= pos + RGBA_SIZE:
+                self.colors[entry.name_hash] = (pos, read_rgba(data, pos))
+            else:
+                self.colors[entry.name_hash] = None
+        return self.colors[entry.name_hash]
+
+    def materials(self, pattern="*.xbm", include_unnamed=False):
+        """Yield (entry, name, position, rgba, error) for every matching entry with a color
+
+        Entries that cannot be read (corrupt data, LZO without python-lzo)
+        are yielded with position and rgba None and the error message.
+        """
+        with open(self.dat_path, 'rb') as dat:
+            for entry, name in self.iter_entries(pattern, include_unnamed):
+                try:
+                    found = self.scan(entry, dat)
+                except (ArchiveError, zlib.error) as e:
+                    yield (entry, name, None, None, str(e))
+                    continue
+                if found is not None:
+                    yield (entry, name) + found + (None,)
+
+    def patch_color(self, entry, rgba=None, transform=None):
+        """Set an entry's IlluminationColor1; returns (position, old_rgba, new_rgba) or None"""
+        outcome = self.patch_colors([(entry, rgba)], transform)[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def patch_colors(self, changes, transform=None):
+        """Set the IlluminationColor1 of many entries; changes is a list of (entry, rgba)
+
+        Returns one outcome per change, in order: (position, old_rgba,
+        new_rgba), None when the entry has no color, or the exception that
+        stopped it. Uncompressed entries are patched in place; compressed
+        ones are all appended with a single fsync and repointed with a
+        single .fat rewrite, so a batch costs one index write, not one per
+        entry.
+        """
+        outcomes = [None] * len(changes)
+        appends = []  # (change index, entry, data, position)
+        with open(self.dat_path, 'r+b') as dat:
+            for i, (entry, rgba) in enumerate(changes):
+                try:
+                    data = bytearray(self.read_entry(entry, dat))
+                    pos = locate_illumination_color(data)
+                    if pos is None or len(data) < pos + RGBA_SIZE:
+                        continue
+                    old_rgba = read_rgba(data, pos)
+                    write_rgba(data, pos, tuple(transform(old_rgba)) if transform else tuple(rgba))
+                    new_rgba = read_rgba(data, pos)
+                    outcomes[i] = (pos, old_rgba, new_rgba)
+                    if entry.compression == COMPRESSION_NONE:
+                        dat.seek(entry.offset + pos)
+                        dat.write(data[pos:pos + RGBA_SIZE])
+                        self.colors[entry.name_hash] = (pos, new_rgba)
+                    else:
+                        appends.append((i, entry, data, pos))
+                except (ArchiveError, zlib.error) as e:
+                    outcomes[i] = e
+            dat.flush()
+            os.fsync(dat.fileno())
+
+        if appends:
+            try:
+                self._append_entries([(entry, data) for i, entry, data, pos in appends])
+            except (ArchiveError, OSError, zlib.error) as e:
+                for i, entry, data, pos in appends:
+                    outcomes[i] = e
+            else:
+                for i, entry, data, pos in appends:
+                    self.colors[entry.name_hash] = (pos, outcomes[i][2])
+        return outcomes
+
+    def write_material(self, name, material):
+        """Store a whole edited material buffer back into its entry"""
+        entry = self.find(name)
+        if len(material.data) != entry.size:
+            raise ArchiveError("Edited entries must keep their size")
+        if entry.compression == COMPRESSION_NONE:
+            self._write_dat(entry.offset, bytes(material.data))
+        else:
+            self._append_entries([(entry, material.data)])
+        if material.has_color:
+            self.colors[entry.name_hash] = (material.illumination_color_position, material.get_color())
+
+    def _write_dat(self, offset, data):
+        with open(self.dat_path, 'r+b') as f:
+            f.seek(offset)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _append_entries(self, items):
+        """Append recompressed (entry, data) items to the .dat, then repoint them in the .fat
+
+        The old compressed bytes are never touched: until the .fat is
+        swapped in, it still points at them, so a crash at any point leaves
+        either the old or the new entries readable (plus some unused bytes
+        at the end of the .dat). All items share one fsync and one .fat
+        rewrite.
+        """
+        blobs = [(entry, compress_entry(entry, data)) for entry, data in items]
+        updated = []
+        with open(self.dat_path, 'r+b') as f:
+            offset = f.seek(0, os.SEEK_END)
+            if (offset + sum(len(blob) for entry, blob in blobs)) >> 34:
+                raise ArchiveError(".dat is too large to append to")
+            for entry, blob in blobs:
+                f.write(blob)
+                updated.append(entry._replace(offset=offset, compressed_size=len(blob)))
+                offset += len(blob)
+            f.flush()
+            os.fsync(f.fileno())
+
+        with open(self.fat_path, 'rb') as f:
+            fat = bytearray(f.read())
+        for entry in updated:
+            start = HEADER.size + entry.index * ENTRY.size
+            fat[start:start + ENTRY.size] = encode_entry(entry)
+        atomic_write(self.fat_path, fat)
+
+        for entry in updated:
+            self.entries[entry.index] = entry
+            self._by_hash[entry.name_hash] = entry
+
+    def close(self):
+        """Save the index and color scans for the next run"""
+        self.save_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
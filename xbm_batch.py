@@ -0,0 +1,634 @@
+import argparse
+import fnmatch
+import itertools
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from xbm_archive import ArchiveError, DuniaArchive, entry_path, split_entry_path
+from xbm_cache import DEFAULT_CACHE_PATH, ScanCache, ScanRecord, patched_record, scan_file
+from xbm_journal import DEFAULT_JOURNAL_DIR, Journal, JournalError, default_journal_path, rollback
+from xbm_watch import DEFAULT_DEBOUNCE, open_watcher, watch
+from xbm_core import (XbmMaterial, apply_color_rule, check_colors, iter_xbm_files, patch_file_in_place,
+                      patch_parameters_in_place, scan_stream, write_colors_in_place)
+
+# status is one of 'found' (dry run), 'patched', 'skipped' or 'error';
+# error holds the error message, or the reason a file was skipped
+PatchResult = namedtuple('PatchResult', 'path parameter status position old_rgba new_rgba error')
+
+DEFAULT_PARAMETER = 'IlluminationColor1'
+
+
+def patch_file(path, output_path=None, dry_run=False, in_place=False, backup=False,
+               parameter=None, **rule):
+    """Patch a single XBM file and return a list of PatchResults
+
+    Without parameter only the first IlluminationColor1 is edited. With an
+    fnmatch pattern (e.g. 'IlluminationColor*'), every matching color
+    parameter found in one scan of the file is edited and reported.
+    """
+    def transform(name, rgba):
+        return apply_color_rule(rgba, **rule)
+
+    if in_place and not dry_run and output_path is None:
+        if parameter is None:
+            patched = patch_file_in_place(path, transform=lambda rgba: transform(DEFAULT_PARAMETER, rgba),
+                                          backup=backup)
+            changes = [(DEFAULT_PARAMETER,) + patched] if patched else []
+        else:
+            changes = patch_parameters_in_place(path, transform, parameter, backup)
+        if not changes:
+            return [PatchResult(path, parameter, 'skipped', None, None, None, None)]
+        return [PatchResult(path, name, 'patched', pos, old_rgba, new_rgba, None)
+                for name, pos, old_rgba, new_rgba in changes]
+
+    material = XbmMaterial.load(path)
+    if parameter is None:
+        targets = [(DEFAULT_PARAMETER, material.illumination_color_position)] if material.has_color else []
+    else:
+        targets = [(p.name, p.position) for p in material.color_parameters
+                   if fnmatch.fnmatchcase(p.name, parameter)]
+    if not targets:
+        return [PatchResult(path, parameter, 'skipped', None, None, None, None)]
+
+    results = []
+    status = 'found' if dry_run else 'patched'
+    for name, pos in targets:
+        old_rgba = material.get_color(pos)
+        new_rgba = transform(name, old_rgba)
+        material.set_color(new_rgba, pos)
+        results.append(PatchResult(path, name, status, pos, old_rgba, new_rgba, None))
+
+    if not dry_run:
+        material.save(output_path)
+
+    return results
+
+
+def _patch_job(job):
+    """Worker entry point; never raises so one bad file cannot stop the batch"""
+    path, output_path, dry_run, rule = job
+    try:
+        return patch_file(path, output_path, dry_run, **rule)
+    except Exception as e:
+        return [PatchResult(path, rule.get('parameter'), 'error', None, None, None, str(e))]
+
+
+def _scan_job(path):
+    """Worker entry point for cache misses; returns [ScanRecord] or [PatchResult] on error"""
+    try:
+        return [scan_file(path)]
+    except Exception as e:
+        return [PatchResult(path, None, 'error', None, None, None, str(e))]
+
+
+def record_targets(record, parameter=None):
+    """(name, position, rgba) of the colors a batch would edit in a ScanRecord"""
+    if parameter is None:
+        return [(DEFAULT_PARAMETER, record.position, record.rgba)] if record.rgba else []
+    return [color for color in record.colors if fnmatch.fnmatchcase(color[0], parameter)]
+
+
+def record_colors(record):
+    """Every color parameter of a ScanRecord
+
+    When the scanner's IlluminationColor1 hits disagree with the offset from
+    locate_illumination_color (e.g. the name also appears in a texture path),
+    that offset is used for IlluminationColor1.
+    """
+    colors = record.colors
+    if record.rgba is not None and not any(pos == record.position for name, pos, rgba in colors):
+        colors = [(DEFAULT_PARAMETER, record.position, record.rgba)] + \
+                 [color for color in colors if color[0] != DEFAULT_PARAMETER]
+    return colors
+
+
+def _write_job(job):
+    """Worker entry point writing precomputed colors; job is (path, output_path, changes, in_place, backup)
+
+    Files that no longer hold the scanned colors are reported as errors and
+    left untouched, so a journal never records a write that did not happen.
+    """
+    path, output_path, changes, in_place, backup = job
+    writes = [(pos, new_rgba) for name, pos, old_rgba, new_rgba in changes]
+    expected = [old_rgba for name, pos, old_rgba, new_rgba in changes]
+    try:
+        if in_place and output_path is None:
+            write_colors_in_place(path, writes, backup, expected)
+        else:
+            material = XbmMaterial.load(path)
+            check_colors(material.data, path, writes, expected)
+            for pos, rgba in writes:
+                material.set_color(rgba, pos)
+            material.save(output_path)
+    except Exception as e:
+        return [PatchResult(path, None, 'error', None, None, None, str(e))]
+    return [PatchResult(path, name, 'patched', pos, old_rgba, new_rgba, None)
+            for name, pos, old_rgba, new_rgba in changes]
+
+
+def run_planned(files, select, compute, output_for=None, dry_run=False,
+                in_place=False, backup=False, cache=None, workers=1, journal=None, parameter=None):
+    """Scan every file, compute all new colors in one go, then write them back
+
+    select(record) returns the (name, position, rgba) colors of a ScanRecord
+    to consider; compute(targets) receives every (path, name, position, rgba)
+    at once and returns a new RGBA (or None to leave it alone) for each.
+    Scanning goes through the cache and worker pool; writing is per file.
+    output_for(path) gives the output path, or None to patch in place.
+    parameter is the -p pattern reported on files with nothing selected.
+    With a Journal, every change is recorded and synced before any file is
+    written, so the batch can be rolled back (see xbm_journal.rollback).
+    Files patched in place are stored back into the cache with their new
+    colors, so the next run does not have to re-read them.
+    """
+    records = []
+    misses = []
+    for path in files:
+        record = cache.lookup(path) if cache is not None else None
+        if record is not None:
+            records.append(record)
+        else:
+            misses.append(path)
+
+    for item in run_batch(misses, workers=workers, job_func=_scan_job):
+        if isinstance(item, ScanRecord):
+            if cache is not None:
+                cache.store(item)
+            records.append(item)
+        else:
+            yield item
+
+    targets = []
+    for record in records:
+        for name, pos, rgba in select(record):
+            targets.append((record.path, name, pos, rgba))
+
+    new_colors = compute(targets) if targets else []
+
+    changes_by_path = {}
+    for (path, name, pos, rgba), new_rgba in zip(targets, new_colors):
+        if new_rgba is not None:
+            changes_by_path.setdefault(path, []).append((name, pos, rgba, tuple(new_rgba)))
+
+    selected_paths = set(path for path, name, pos, rgba in targets)
+    for record in records:
+        if record.path not in changes_by_path:
+            reason = "no matching rule" if record.path in selected_paths else None
+            yield PatchResult(record.path, parameter, 'skipped', None, None, None, reason)
+
+    if dry_run:
+        for path, changes in changes_by_path.items():
+            for name, pos, old_rgba, new_rgba in changes:
+                yield PatchResult(path, name, 'found', pos, old_rgba, new_rgba, None)
+        return
+
+    if journal is not None:
+        for path, changes in changes_by_path.items():
+            journal.record_colors(path, changes)
+        journal.commit()
+
+    write_jobs = ((path, output_for(path) if output_for else None, changes, in_place, backup)
+                  for path, changes in changes_by_path.items())
+    written = {}
+    for result in run_batch(write_jobs, workers=workers, job_func=_write_job):
+        if result.status == 'patched':
+            written.setdefault(result.path, {})[result.position] = result.new_rgba
+        yield result
+
+    if cache is not None:
+        records_by_path = {record.path: record for record in records}
+        for path, new_colors in written.items():
+            if output_for is None or output_for(path) is None:
+                record = patched_record(records_by_path[path], new_colors)
+                if record is not None:
+                    cache.store(record)
+
+
+def run_vectorized(files, pipeline, parameter=None, **options):
+    """Recolor every file with a TransformPipeline in one vectorized pass
+
+    All selected colors are stacked into one (N, 4) float32 array and
+    transformed at once. options are passed on to run_planned.
+    """
+    def compute(targets):
+        return pipeline.apply([rgba for path, name, pos, rgba in targets]).tolist()
+
+    return run_planned(files, lambda record: record_targets(record, parameter), compute,
+                       parameter=parameter, **options)
+
+
+def run_archive(archive, compute, pattern="*.xbm", include_unnamed=False, dry_run=False):
+    """Recolor the IlluminationColor1 of materials inside a DuniaArchive
+
+    compute(targets) works as in run_planned; paths are 'archive.fat::entry'.
+    Entries are read straight from the .dat and patched in place where
+    possible; recompressed entries are written back in one batch.
+    """
+    materials = []
+    for entry, name, pos, rgba, error in archive.materials(pattern, include_unnamed):
+        if error is not None:
+            yield PatchResult(entry_path(archive.fat_path, name), None, 'error', None, None, None, error)
+        else:
+            materials.append((entry, name, pos, rgba))
+    targets = [(entry_path(archive.fat_path, name), DEFAULT_PARAMETER, pos, rgba)
+               for entry, name, pos, rgba in materials]
+    new_colors = compute(targets) if targets else []
+
+    changes = []
+    for (entry, name, pos, rgba), (path, _, _, _), new_rgba in zip(materials, targets, new_colors):
+        if new_rgba is None:
+            yield PatchResult(path, None, 'skipped', None, None, None, "no matching rule")
+        elif dry_run:
+            yield PatchResult(path, DEFAULT_PARAMETER, 'found', pos, rgba, tuple(new_rgba), None)
+        else:
+            changes.append((path, entry, new_rgba))
+    if not changes:
+        return
+
+    try:
+        outcomes = archive.patch_colors([(entry, new_rgba) for path, entry, new_rgba in changes])
+    except Exception as e:
+        outcomes = [e] * len(changes)
+    for (path, entry, new_rgba), outcome in zip(changes, outcomes):
+        if isinstance(outcome, Exception):
+            yield PatchResult(path, DEFAULT_PARAMETER, 'error', None, None, None, str(outcome))
+        elif outcome is None:
+            yield PatchResult(path, DEFAULT_PARAMETER, 'skipped', None, None, None, None)
+        else:
+            pos, old_rgba, new_rgba = outcome
+            yield PatchResult(path, DEFAULT_PARAMETER, 'patched', pos, old_rgba, new_rgba, None)
+
+
+_NO_JOBS = object()
+
+
+def run_batch(jobs, workers=None, max_pending=None, job_func=_patch_job):
+    """Run jobs through job_func and yield its results as they finish
+
+    job_func defaults to the patch worker, which takes
+    (path, output_path, dry_run, rule) tuples and returns PatchResults.
+    workers=1 runs serially in this process. Otherwise jobs are fanned out
+    to a process pool with at most max_pending jobs queued at once, so
+    huge trees do not get submitted to the pool all up front. The pool is
+    only started once there is a first job, so an all-cache-hit run with
+    nothing left to scan stays in this process.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1:
+        for job in jobs:
+            yield from job_func(job)
+        return
+
+    # Starting a pool costs a process spawn per worker; skip it when there is nothing to run
+    jobs = iter(jobs)
+    first = next(jobs, _NO_JOBS)
+    if first is _NO_JOBS:
+        return
+
+    if max_pending is None:
+        max_pending = workers * 4
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for job in itertools.chain((first,), jobs):
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+            pending.add(executor.submit(job_func, job))
+
+        for future in pending:
+            yield from future.result()
+
+
+def format_result(result):
+    """Format a PatchResult as a single report line"""
+    if result.status in ('patched', 'found'):
+        old_text = ", ".join(f"{v:.3f}" for v in result.old_rgba)
+        new_text = ", ".join(f"{v:.3f}" for v in result.new_rgba)
+        return (f"{result.status:<8} {result.path} {result.parameter} @ {result.position}: "
+                f"({old_text}) -> ({new_text})")
+    if result.status == 'error':
+        return f"error    {result.path}: {result.error}"
+    reason = result.error or f"{result.parameter or DEFAULT_PARAMETER} not found"
+    return f"skipped  {result.path}: {reason}"
+
+
+def build_parser():
+    """Create the batch command-line parser"""
+    parser = argparse.ArgumentParser(
+        prog="xbm_batch",
+        description="Batch-edit IlluminationColor1 values across a directory of Avatar XBM files"
+    )
+    parser.add_argument("input", nargs="?", help="XBM file, directory or Dunia .fat archive to process")
+    parser.add_argument("-o", "--output", help="Output directory (default: patch files in place)")
+    parser.add_argument("-g", "--glob", default="*.xbm", help="File name pattern (default: *.xbm)")
+    parser.add_argument("-p", "--param", metavar="PATTERN",
+                        help="Edit every color parameter matching this name pattern "
+                             "(e.g. 'IlluminationColor*'); default: first IlluminationColor1")
+    parser.add_argument("--color", nargs=3, type=float, metavar=("R", "G", "B"),
+                        help="Set RGB to these raw values")
+    parser.add_argument("--scale", type=float, help="Multiply RGB by this factor")
+    parser.add_argument("--hdr-scale", type=float,
+                        help="Rescale RGB so the brightest channel equals this value")
+    parser.add_argument("--alpha", type=float, help="Set alpha to this value")
+    parser.add_argument("-t", "--transform", action="append", metavar="OP",
+                        help="Vectorized NumPy transform applied to all colors at once; repeatable, "
+                             "applied in order: hue:DEG, scale:F, hdr:N, normalize, clamp:LO:HI, "
+                             "tint:R,G,B:AMOUNT, alpha:A")
+    parser.add_argument("-r", "--rules", metavar="FILE",
+                        help="Apply a JSON/TOML recolor rules file (path globs, color predicates, actions)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Worker processes (default: 1, 0 = one per CPU)")
+    parser.add_argument("--mmap", action="store_true",
+                        help="Patch in place through a memory map, writing only the 16 color bytes")
+    parser.add_argument("--backup", action="store_true",
+                        help="With --mmap, keep a .bak copy of each file before patching")
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_CACHE_PATH, metavar="DB",
+                        help="Use a persistent scan cache so unchanged files are not re-read "
+                             f"(default location: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--journal", nargs="?", const="", metavar="FILE",
+                        help="Record every in-place change (path, offset, old/new bytes) before writing "
+                             f"so the batch can be undone with --rollback (default location: {DEFAULT_JOURNAL_DIR})")
+    parser.add_argument("--filelist", metavar="FILE",
+                        help="Archive path list used to name .fat entries "
+                             "(default: the .filelist next to the archive)")
+    parser.add_argument("--all-entries", action="store_true",
+                        help="Also scan .fat entries whose names are unknown")
+    parser.add_argument("--stream", action="store_true",
+                        help="Scan the input as one raw blob (.dat, memory dump, bundle; '-' for stdin) "
+                             "in fixed-size chunks and report every IlluminationColor1 (or -p NAME) "
+                             "with its absolute offset, using constant memory")
+    parser.add_argument("--chunk-size", type=int, default=4 * 1024 * 1024,
+                        help="Window size in bytes for --stream (default: 4 MiB)")
+    parser.add_argument("--rollback", metavar="JOURNAL",
+                        help="Undo the batch recorded in a journal file and exit")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and re-apply the rule to files that change under the input "
+                             "directory (files already there are left alone)")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE, metavar="SECONDS",
+                        help=f"With --watch, wait until a file has been quiet this long (default: {DEFAULT_DEBOUNCE})")
+    parser.add_argument("--poll", action="store_true",
+                        help="With --watch, poll for changes instead of using inotify")
+    parser.add_argument("-n", "--dry-run", action="store_true", help="Report changes without writing")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only print the summary")
+    return parser
+
+
+def run_rollback(args, parser):
+    """Undo a journaled batch (--rollback) and print what happened to each patch"""
+    counts = {'restored': 0, 'unchanged': 0, 'conflict': 0, 'error': 0}
+    try:
+        for result in rollback(args.rollback, dry_run=args.dry_run):
+            counts[result.status] += 1
+            line = f"{result.status:<9} {result.path} @ {result.offset}"
+            if result.error:
+                line += f": {result.error}"
+            if result.status in ('conflict', 'error'):
+                print(line, file=sys.stderr)
+            elif not args.quiet:
+                print(line)
+    except JournalError as e:
+        parser.error(str(e))
+
+    mode = " (dry run)" if args.dry_run else ""
+    print(f"rollback{mode}: {counts['restored']} restored, {counts['unchanged']} already original, "
+          f"{counts['conflict']} conflicts, {counts['error']} errors")
+    return 1 if counts['conflict'] or counts['error'] else 0
+
+
+def run_stream_scan(args, parser):
+    """Report every color hit in a raw blob (--stream) without loading it into memory"""
+    name = args.param or DEFAULT_PARAMETER
+    if any(c in name for c in '*?['):
+        parser.error("--stream takes a single parameter name, not a pattern")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be positive")
+
+    start = time.perf_counter()
+    hits = 0
+    try:
+        stream = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+    except OSError as e:
+        parser.error(f"cannot open {args.input}: {e}")
+    with stream:
+        # Whole-name matching skips the name inside texture paths and longer strings
+        for offset, rgba in scan_stream(stream, name.encode('ascii'), args.chunk_size, whole_name=True):
+            hits += 1
+            if not args.quiet:
+                rgba_text = ", ".join(f"{v:.3f}" for v in rgba)
+                print(f"found    {args.input} {name} @ {offset}: ({rgba_text})")
+        size = stream.tell() if stream.seekable() else None
+
+    elapsed = time.perf_counter() - start
+    size_text = f" ({size / (1024 * 1024):.1f} MB)" if size is not None else ""
+    print(f"{hits} {name} values in {elapsed:.2f}s{size_text}")
+    return 0
+
+
+def run_watch(args, process, summary):
+    """Re-run process(files) on each debounced batch of changed files until interrupted
+
+    Returns the paths and status counts over the whole session.
+    """
+    exclude = args.output if args.output else None
+    watcher = open_watcher(args.input, args.glob, exclude, use_inotify=not args.poll)
+    print(f"watching {args.input} for {args.glob} ({watcher.name}); press Ctrl+C to stop")
+    sys.stdout.flush()
+
+    seen_paths = set()
+    counts = {'found': 0, 'patched': 0, 'skipped': 0, 'error': 0}
+
+    def handle(paths):
+        start = time.perf_counter()
+        batch_paths, batch_counts = process(paths)
+        print(summary(batch_paths, batch_counts, time.perf_counter() - start))
+        sys.stdout.flush()
+        seen_paths.update(batch_paths)
+        for status, count in batch_counts.items():
+            counts[status] += count
+
+    try:
+        watch(watcher, handle, debounce=args.debounce)
+    except KeyboardInterrupt:
+        print("watch stopped")
+    finally:
+        watcher.close()
+    return seen_paths, counts
+
+
+def main(argv=None):
+    """Command-line entry point for headless batch edits"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.rollback:
+        return run_rollback(args, parser)
+    if args.input is None:
+        parser.error("the following arguments are required: input")
+    if args.stream:
+        return run_stream_scan(args, parser)
+
+    rule = {'color': args.color, 'scale': args.scale,
+            'hdr_scale': args.hdr_scale, 'alpha': args.alpha}
+    has_rule = any(value is not None for value in rule.values())
+    modes = sum(bool(mode) for mode in (has_rule, args.transform, args.rules))
+    if modes == 0:
+        parser.error("no color rule given (use --color, --scale, --hdr-scale, --alpha, --transform or --rules)")
+    if modes > 1:
+        parser.error("--transform, --rules and --color/--scale/--hdr-scale/--alpha are mutually exclusive")
+
+    ruleset = None
+    if args.rules:
+        from xbm_rules import RuleError, load_rules
+        try:
+            ruleset = load_rules(args.rules)
+        except RuleError as e:
+            parser.error(str(e))
+
+    pipeline = None
+    if args.transform:
+        try:
+            from xbm_transform import TransformPipeline
+            pipeline = TransformPipeline(args.transform)
+        except ImportError:
+            parser.error("--transform requires NumPy (pip install numpy)")
+        except ValueError as e:
+            parser.error(str(e))
+    if args.mmap and args.output:
+        parser.error("--mmap patches files in place and cannot be combined with --output")
+    if args.journal is not None and (args.output or args.dry_run):
+        parser.error("--journal records in-place writes and cannot be combined with --output or --dry-run")
+
+    if args.watch and not os.path.isdir(args.input):
+        parser.error("--watch needs a directory to watch")
+    if args.debounce < 0:
+        parser.error("--debounce must not be negative")
+
+    archive = None
+    if args.input.lower().endswith('.fat'):
+        if args.output or args.journal is not None or args.param:
+            parser.error("archives are patched in place; --output, --journal and --param are not supported")
+        try:
+            archive = DuniaArchive(args.input, filelist=args.filelist)
+        except (OSError, ArchiveError) as e:
+            parser.error(f"cannot open archive {args.input}: {e}")
+
+    if os.path.isdir(args.input):
+        files = iter_xbm_files(args.input, args.glob)
+        base_dir = args.input
+    else:
+        files = [args.input]
+        base_dir = os.path.dirname(args.input)
+
+    cache = ScanCache(args.cache) if args.cache else None
+    journal = None
+    if args.journal is not None:
+        journal_path = args.journal or default_journal_path()
+        try:
+            journal = Journal(journal_path, description=" ".join(argv if argv is not None else sys.argv[1:]))
+        except OSError as e:
+            parser.error(f"cannot create journal {journal_path}: {e}")
+
+    def jobs(files):
+        options = dict(rule, in_place=args.mmap, backup=args.backup, parameter=args.param)
+        for path in files:
+            yield (path, output_for(path), args.dry_run, options)
+
+    def output_for(path):
+        return os.path.join(args.output, os.path.relpath(path, base_dir)) if args.output else None
+
+    def apply_rules(targets):
+        path_rules = {}
+        new_colors = []
+        for path, name, pos, rgba in targets:
+            if path not in path_rules:
+                archive_entry = split_entry_path(path)
+                if archive_entry:
+                    relpath = archive_entry[1]
+                elif base_dir:
+                    relpath = os.path.relpath(path, base_dir)
+                else:
+                    relpath = path
+                path_rules[path] = ruleset.rules_for_path(relpath)
+            rules = path_rules[path]
+            new_colors.append(ruleset.evaluate(None, name, rgba, rules) if rules else None)
+        return new_colors
+
+    def apply_rule(targets):
+        return [apply_color_rule(rgba, **rule) for path, name, pos, rgba in targets]
+
+    def apply_pipeline(targets):
+        return pipeline.apply([rgba for path, name, pos, rgba in targets]).tolist()
+
+    def results(files):
+        if archive is not None:
+            compute = apply_rules if ruleset is not None else apply_pipeline if pipeline is not None else apply_rule
+            yield from run_archive(archive, compute, args.glob, args.all_entries, args.dry_run)
+            return
+        options = dict(output_for=output_for, dry_run=args.dry_run, in_place=args.mmap,
+                       backup=args.backup, cache=cache, workers=args.jobs or None, journal=journal)
+        if ruleset is not None:
+            yield from run_planned(files, record_colors, apply_rules, **options)
+            return
+        if pipeline is not None:
+            yield from run_vectorized(files, pipeline, args.param, **options)
+            return
+        if journal is not None or cache is not None:
+            # Journaled batches plan every change before writing anything; cached
+            # ones scan through the cache and store what they write
+            yield from run_planned(files, lambda record: record_targets(record, args.param),
+                                   apply_rule, parameter=args.param, **options)
+            return
+        yield from run_batch(jobs(files), workers=args.jobs or None)
+
+    def process(files):
+        """Run the batch over files and print each result; returns (paths seen, status counts)"""
+        counts = {'found': 0, 'patched': 0, 'skipped': 0, 'error': 0}
+        seen_paths = set()
+        for result in results(files):
+            seen_paths.add(result.path)
+            counts[result.status] += 1
+            if result.status == 'error':
+                print(format_result(result), file=sys.stderr)
+            elif not args.quiet:
+                print(format_result(result))
+        return seen_paths, counts
+
+    def summary(seen_paths, counts, elapsed):
+        if args.dry_run:
+            mode, changed = " (dry run)", f"{counts['found']} colors found (would patch)"
+        else:
+            mode, changed = "", f"{counts['patched']} colors patched"
+        return (f"{len(seen_paths)} files in {elapsed:.2f}s{mode}: {changed}, "
+                f"{counts['skipped']} skipped, {counts['error']} errors")
+
+    start = time.perf_counter()
+
+    if args.watch:
+        seen_paths, counts = run_watch(args, process, summary)
+    else:
+        seen_paths, counts = process(files)
+
+    if cache is not None:
+        print(f"cache: {cache.hits} hits, {cache.misses} misses")
+        cache.close()
+    if archive is not None:
+        archive.close()
+    if journal is not None:
+        journal.close()
+        print(f"journal: {journal.entries} changes recorded in {journal.path} "
+              f"(undo with --rollback {journal.path})")
+
+    print(summary(seen_paths, counts, time.perf_counter() - start))
+
+    return 1 if counts['error'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""Persistent scan cache for XBM materials.
+
+Each scanned file's IlluminationColor1 offset and RGBA and all of its
+color parameters are stored in SQLite keyed by path, size
+and modification time, so unchanged files never need to be re-read.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+from collections import namedtuple
+
+from xbm_core import XbmMaterial
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".xbm_color_editor", "scan_cache.db")
+
+# colors is a list of (name, position, rgba) for every color parameter
+ScanRecord = namedtuple('ScanRecord', 'path size mtime_ns sha1 position rgba colors')
+
+
+def file_sha1(path):
+    """SHA-1 of a file's contents"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def record_from_material(material, st, with_hash=False):
+    """Build a ScanRecord from an already loaded XbmMaterial and its os.stat result"""
+    rgba = material.get_color() if material.has_color else None
+    colors = [(p.name, p.position, material.get_color(p.position)) for p in material.color_parameters]
+    sha1 = hashlib.sha1(material.data).hexdigest() if with_hash else None
+    return ScanRecord(material.path, st.st_size, st.st_mtime_ns, sha1,
+                      material.illumination_color_position if rgba else None,
+                      rgba, colors)
+
+
+def patched_record(record, new_colors):
+    """record after its colors were rewritten in place, or None if the file is gone
+
+    new_colors maps positions to the RGBA written there. The file is
+    stat'ed again so the record matches its new mtime; the hash is dropped
+    rather than recomputed.
+    """
+    try:
+        st = os.stat(record.path)
+    except OSError:
+        return None
+    rgba = new_colors.get(record.position, record.rgba) if record.rgba is not None else None
+    colors = [(name, pos, new_colors.get(pos, color)) for name, pos, color in record.colors]
+    return record._replace(size=st.st_size, mtime_ns=st.st_mtime_ns, sha1=None, rgba=rgba, colors=colors)
+
+
+def scan_file(path, with_hash=False):
+    """Read and scan a file, returning a ScanRecord"""
+    st = os.stat(path)
+    return record_from_material(XbmMaterial.load(path), st, with_hash)
+
+
+class ScanCache:
+    """SQLite-backed ScanRecord store keyed by path, size and mtime"""
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, verify_hash=False):
+        self.db_path = db_path
+        self.verify_hash = verify_hash
+        if db_path != ":memory:":
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha1 TEXT, data TEXT)"
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+    def commit(self):
+        self.conn.commit()
+
+    def lookup(self, path):
+        """Return the cached ScanRecord for path if the file is unchanged, else None"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, sha1, data FROM files WHERE path = ?", (os.path.abspath(path),)
+        ).fetchone()
+        if row is None or row[0] != st.st_size or row[1] != st.st_mtime_ns:
+            self.misses += 1
+            return None
+        if self.verify_hash and row[2] and row[2] != file_sha1(path):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        data = json.loads(row[3])
+        rgba = tuple(data['rgba']) if data['rgba'] is not None else None
+        colors = [(name, pos, tuple(color)) for name, pos, color in data['colors']]
+        return ScanRecord(path, row[0], row[1], row[2], data['position'], rgba, colors)
+
+    def store(self, record):
+        """Insert or replace a ScanRecord (call commit() or close() to persist)"""
+        data = json.dumps({
+            'position': record.position,
+            'rgba': record.rgba,
+            'colors': record.colors,
+        }, separators=(',', ':'))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, sha1, data) VALUES (?, ?, ?, ?, ?)",
+            (os.path.abspath(record.path), record.size, record.mtime_ns, record.sha1, data)
+        )
+
+    def invalidate(self, path):
+        self.conn.execute("DELETE FROM files WHERE path = ?", (os.path.abspath(path),))
+
+    def scan(self, path):
+        """Return the cached record for path, scanning and storing it on a miss"""
+        record = self.lookup(path)
+        if record is None:
+            record = scan_file(path, with_hash=self.verify_hash)
+            self.store(record)
+        return record
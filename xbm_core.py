@@ -0,0 +1,474 @@
+"""Byte-level XBM material parsing and patching.
+
+This module has no GUI dependencies so it can be imported cheaply from
+scripts, batch jobs and worker processes.
+"""
+import colorsys
+import fnmatch
+import mmap
+import os
+import re
+import shutil
+import struct
+from collections import namedtuple
+
+ILLUMINATION_PATTERN = b'IlluminationColor1'
+COLOR_KEYS = ('red', 'green', 'blue', 'alpha')
+RGBA_SIZE = 16
+# Longest gap scan_stream allows between a name and its terminating NUL
+MAX_NAME_GAP = 256
+
+# Color parameter names end in this, optionally followed by digits
+COLOR_SUFFIX = b'Color'
+
+ColorParameter = namedtuple('ColorParameter', 'name position')
+
+COLOR_NAME_RE = re.compile(r'Color[0-9]*$')
+FLOAT_TYPES = {4: 'float', 8: 'float2', 12: 'float3', 16: 'float4'}
+# Magnitudes a real color component can have; text read as floats lands far outside
+PLAUSIBLE_FLOAT_RANGE = (1e-6, 1e6)
+# Bytes that may not precede a whole parameter name, so the tail of a longer
+# string or path (textures/a_IlluminationColor1) is not taken for one
+NAME_PREFIX_BYTES = frozenset(b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_./\\')
+IDENTIFIER_BYTES = frozenset(b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_')
+DIGIT_BYTES = frozenset(b'0123456789')
+
+
+def find_illumination_color(data, pattern=ILLUMINATION_PATTERN):
+    """Return the offset of the float4 following pattern, or None"""
+    pos = data.find(pattern)
+    if pos != -1:
+        null_pos = data.find(b'\x00', pos + len(pattern))
+        if null_pos != -1:
+            return null_pos + 1
+    return None
+
+
+def find_color_parameters(data, match=None):
+    """Return every color parameter in data as a list of ColorParameter
+
+    The buffer is swept once for b'Color' with bytes.find, so finding N
+    parameters does not rescan the file N times. match is an optional
+    fnmatch pattern on the parameter name (e.g. 'IlluminationColor*'). Only
+    whole names directly followed by a NUL and a value that classifies as
+    float4 count, as in find_parameter, so DiffuseColorMap or textures/a_IlluminationColor1 never match. Entries
+    whose float4 would run past the end of the buffer are dropped.
+    """
+    parameters = []
+    size = len(data)
+    limit = size - RGBA_SIZE
+    pos = data.find(COLOR_SUFFIX)
+    while pos != -1:
+        hit, pos = pos, data.find(COLOR_SUFFIX, pos + 1)
+
+        end = hit + len(COLOR_SUFFIX)
+        while end < size and data[end] in DIGIT_BYTES:
+            end += 1
+        if end >= size or data[end] != 0:
+            continue
+        start = hit
+        while start > 0 and data[start - 1] in IDENTIFIER_BYTES:
+            start -= 1
+        if (start == hit or data[start] in DIGIT_BYTES
+                or (start > 0 and data[start - 1] in NAME_PREFIX_BYTES)):
+            continue
+        position = end + 1
+        if position > limit:
+            continue
+        name = bytes(data[start:end]).decode('ascii')
+        if match and not fnmatch.fnmatchcase(name, match):
+            continue
+        if _classify_value(name, bytes(data[position:position + RGBA_SIZE]))[0] != 'float4':
+            continue
+        parameters.append(ColorParameter(name, position))
+    return parameters
+
+
+def _plausible_float4(value):
+    """True when the first 16 bytes read as four finite floats of sensible magnitude"""
+    low, high = PLAUSIBLE_FLOAT_RANGE
+    return all(v == 0.0 or low <= abs(v) <= high for v in struct.unpack_from('<4f', value))
+
+
+def _classify_value(name, value):
+    """Guess (type, length) of the value bytes that follow a parameter name
+
+    A 16-byte value (or any value of a *Color[N] parameter) that reads as
+    plausible floats is a float4 even when its leading bytes look like text:
+    3.3 is stored as b'33S@', so the string check alone misreads HDR colors.
+    """
+    if (len(value) == RGBA_SIZE or (COLOR_NAME_RE.search(name) and len(value) >= RGBA_SIZE)) \
+            and _plausible_float4(value):
+        return ('float4', RGBA_SIZE)
+    nul = value.find(b'\x00')
+    if nul > 0 and all(0x20 <= c < 0x7f for c in value[:nul]):
+        return ('string', nul + 1)
+    if COLOR_NAME_RE.search(name) and len(value) >= RGBA_SIZE:
+        return ('float4', RGBA_SIZE)
+    if len(value) in FLOAT_TYPES:
+        return (FLOAT_TYPES[len(value)], len(value))
+    return ('raw', len(value))
+
+
+def find_parameter(data, name):
+    """Offset of the first whole float4 parameter called name, or None
+
+    Uses bytes.find for name + NUL, so a lookup runs at memchr speed without
+    parsing the rest of the parameter block. The hit must not be the tail of
+    a longer name or path, and the 16 bytes after the NUL must classify as
+    a float4.
+    """
+    needle = name.encode('ascii') + b'\x00'
+    pos = data.find(needle)
+    while pos != -1:
+        if pos == 0 or data[pos - 1] not in NAME_PREFIX_BYTES:
+            offset = pos + len(needle)
+            value = bytes(data[offset:offset + RGBA_SIZE])
+            if len(value) == RGBA_SIZE and _classify_value(name, value)[0] == 'float4':
+                return offset
+        pos = data.find(needle, pos + 1)
+    return None
+
+
+def locate_illumination_color(data):
+    """Offset of the IlluminationColor1 float4 as a whole parameter
+
+    Uses the fast find_parameter search, falling back to the "first NUL after
+    the name" search when the name is not a whole parameter (e.g. unusual
+    layouts).
+    """
+    offset = find_parameter(data, 'IlluminationColor1')
+    if offset is not None:
+        return offset
+    return find_illumination_color(data)
+
+
+def _stream_value_offset(buffer, pos, needle, max_gap, whole_name):
+    """Offset in buffer of the float4 for a hit at pos, or None (see scan_stream)"""
+    if whole_name:
+        if pos > 0 and buffer[pos - 1] in NAME_PREFIX_BYTES:
+            return None
+        offset = pos + len(needle)
+        name = needle[:-1].decode('ascii')
+        if _classify_value(name, buffer[offset:offset + RGBA_SIZE])[0] != 'float4':
+            return None
+    else:
+        start = pos + len(needle)
+        null_pos = buffer.find(b'\x00', start, start + max_gap)
+        if null_pos == -1:
+            return None
+        offset = null_pos + 1
+    return offset if offset + RGBA_SIZE <= len(buffer) else None
+
+
+def scan_stream(stream, pattern=ILLUMINATION_PATTERN, chunk_size=1024 * 1024,
+                max_gap=MAX_NAME_GAP, whole_name=False):
+    """Yield (offset, rgba) for every pattern hit in a binary stream, in constant memory
+
+    The stream is read in chunk_size windows and the last few bytes of each
+    window are carried into the next, so a name, its NUL and its float4 are
+    found even when they straddle a chunk boundary. offset is absolute in
+    the stream. By default the value follows the first NUL after the name
+    (as find_illumination_color, but within max_gap bytes); with
+    whole_name=True only whole names followed directly by a NUL and a float4
+    count, as in find_parameter.
+    """
+    needle = pattern + b'\x00' if whole_name else pattern
+    overlap = len(needle) + (0 if whole_name else max_gap) + RGBA_SIZE
+    buffer = b''
+    base = 0   # Stream offset of buffer[0]
+    start = 0  # First buffer index that may hold an unprocessed hit
+    while True:
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer += chunk
+        # Hits before limit have all their bytes in the buffer; later ones wait for the next chunk
+        limit = len(buffer) if eof else len(buffer) - overlap
+        pos = buffer.find(needle, start)
+        while pos != -1 and pos < limit:
+            offset = _stream_value_offset(buffer, pos, needle, max_gap, whole_name)
+            if offset is not None:
+                yield base + offset, read_rgba(buffer, offset)
+            pos = buffer.find(needle, pos + 1)
+        if eof:
+            return
+        # Keep one byte before the next unprocessed index for the whole-name check
+        next_start = max(limit, start)
+        cut = max(next_start - 1, 0)
+        buffer = buffer[cut:]
+        base += cut
+        start = next_start - cut
+
+
+def read_rgba(data, pos):
+    """Read four little-endian floats at pos"""
+    return struct.unpack_from('<4f', data, pos)
+
+
+def write_rgba(data, pos, rgba):
+    """Write four little-endian floats at pos"""
+    struct.pack_into('<4f', data, pos, *rgba)
+
+
+def pack_rgba(rgba):
+    """The 16 bytes an RGBA tuple is stored as"""
+    return struct.pack('<4f', *rgba)
+
+
+def describe_color(rgba):
+    """Return (hdr_scale, hue_degrees, saturation) for a raw RGBA tuple
+
+    hdr_scale is max(r, g, b) floored at 1.0, as shown by the editor's HDR
+    indicator; hue and saturation are taken from the normalized color.
+    """
+    r, g, b = rgba[:3]
+    max_rgb = max(r, g, b)
+    hdr_scale = max_rgb if max_rgb > 1.0 else 1.0
+    if max_rgb <= 0:
+        return (hdr_scale, 0.0, 0.0)
+    h, s, v = colorsys.rgb_to_hsv(max(r, 0) / max_rgb, max(g, 0) / max_rgb, max(b, 0) / max_rgb)
+    return (hdr_scale, h * 360.0, s)
+
+
+def apply_color_rule(rgba, color=None, scale=None, hdr_scale=None, alpha=None):
+    """Apply a batch color rule to an RGBA tuple and return the new tuple"""
+    r, g, b, a = rgba
+
+    # Absolute color replaces RGB first, then scaling is applied on top
+    if color is not None:
+        r, g, b = color
+
+    if hdr_scale is not None:
+        # Rescale so the brightest channel equals hdr_scale (same as the HDR picker)
+        max_rgb = max(r, g, b)
+        if max_rgb > 0:
+            factor = hdr_scale / max_rgb
+            r, g, b = r * factor, g * factor, b * factor
+
+    if scale is not None:
+        r, g, b = r * scale, g * scale, b * scale
+
+    if alpha is not None:
+        a = alpha
+
+    return (r, g, b, a)
+
+
+def rgba_to_dict(rgba):
+    """Convert an RGBA tuple to the editor's color dict"""
+    return dict(zip(COLOR_KEYS, rgba))
+
+
+def dict_to_rgba(colors):
+    """Convert the editor's color dict to an RGBA tuple"""
+    return tuple(colors[key] for key in COLOR_KEYS)
+
+
+class LoadCancelled(Exception):
+    """Raised by read_file when its cancelled() callback returns True"""
+
+
+def read_file(path, progress=None, cancelled=None, chunk_size=1024 * 1024):
+    """Read a whole file in chunks, reporting progress(bytes_read, total)
+
+    cancelled() is polled between chunks; LoadCancelled is raised as soon
+    as it returns True.
+    """
+    with open(path, 'rb') as f:
+        total = os.fstat(f.fileno()).st_size
+        data = bytearray()
+        while True:
+            if cancelled is not None and cancelled():
+                raise LoadCancelled(path)
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            data += chunk
+            if progress is not None:
+                progress(len(data), total)
+    return data
+
+
+def iter_xbm_files(root_dir, pattern="*.xbm"):
+    """Walk a directory tree and yield every file matching pattern"""
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if fnmatch.fnmatch(name.lower(), pattern.lower()):
+                yield os.path.join(dirpath, name)
+
+
+class XbmMaterial:
+    """An XBM material buffer with its IlluminationColor1 location"""
+
+    def __init__(self, data, path=None):
+        self.data = data if isinstance(data, bytearray) else bytearray(data)
+        self.path = path
+        self.illumination_color_position = locate_illumination_color(self.data)
+        self._color_parameters = None
+
+    @classmethod
+    def load(cls, path, progress=None, cancelled=None):
+        """Read a material from disk (see read_file for progress/cancelled)"""
+        if progress is None and cancelled is None:
+            with open(path, 'rb') as f:
+                return cls(f.read(), path)
+        return cls(read_file(path, progress, cancelled), path)
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    @property
+    def has_color(self):
+        """True when a complete float4 was found after IlluminationColor1"""
+        pos = self.illumination_color_position
+        return pos is not None and len(self.data) >= pos + RGBA_SIZE
+
+    @property
+    def color_parameters(self):
+        """Every color parameter in the buffer, scanned once on first use"""
+        if self._color_parameters is None:
+            self._color_parameters = find_color_parameters(self.data)
+        return self._color_parameters
+
+    def get_color(self, position=None):
+        """Return the RGBA tuple at position (defaults to IlluminationColor1)"""
+        if position is None:
+            if not self.has_color:
+                raise ValueError("IlluminationColor1 pattern not found")
+            position = self.illumination_color_position
+        return read_rgba(self.data, position)
+
+    def set_color(self, rgba, position=None):
+        """Write an RGBA tuple at position (defaults to IlluminationColor1)"""
+        if position is None:
+            if not self.has_color:
+                raise ValueError("IlluminationColor1 pattern not found")
+            position = self.illumination_color_position
+        write_rgba(self.data, position, rgba)
+
+    def save(self, path=None):
+        """Write the buffer to path (defaults to the file it was loaded from)"""
+        target = path or self.path
+        if not target:
+            raise ValueError("No output path given")
+        target_dir = os.path.dirname(target)
+        if target_dir:
+            os.makedirs(target_dir, exist_ok=True)
+        atomic_write(target, self.data)
+        return target
+
+
+def atomic_write(path, data):
+    """Write data to a temp file next to path, fsync it, then os.replace path
+
+    Readers (and a crash) see either the old file or the complete new one,
+    never a partial write. An existing file's permissions are kept.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _backup_file(path):
+    """Copy path to path + '.bak' via a temp name so a crash never leaves a half backup"""
+    backup_path = path + '.bak'
+    shutil.copy2(path, backup_path + '.tmp')
+    os.replace(backup_path + '.tmp', backup_path)
+
+
+def patch_file_in_place(path, rgba=None, transform=None, backup=False):
+    """Patch the IlluminationColor1 float4 of a file without rewriting it
+
+    The file is memory-mapped, so only the 16 color bytes are written.
+    Pass either a new rgba tuple or a transform(old_rgba) -> new_rgba
+    callable. With backup=True a copy is kept at path + '.bak' first.
+    Returns (position, old_rgba, new_rgba), or None when the pattern is missing.
+    """
+    with open(path, 'r+b') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0) as mm:
+            pos = locate_illumination_color(mm)
+            if pos is None or len(mm) < pos + RGBA_SIZE:
+                return None
+
+            old_rgba = read_rgba(mm, pos)
+            new_rgba = tuple(transform(old_rgba)) if transform else tuple(rgba)
+
+            if backup:
+                _backup_file(path)
+
+            write_rgba(mm, pos, new_rgba)
+            mm.flush()
+
+    return (pos, old_rgba, new_rgba)
+
+
+def patch_parameters_in_place(path, transform, match=None, backup=False):
+    """Memory-mapped patch of every color parameter whose name matches match
+
+    transform(name, old_rgba) returns the new RGBA tuple, or None to leave
+    that parameter alone. Returns a list of (name, position, old_rgba, new_rgba)
+    for the parameters that were written.
+    """
+    with open(path, 'r+b') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0) as mm:
+            changes = []
+            for name, pos in find_color_parameters(mm, match):
+                old_rgba = read_rgba(mm, pos)
+                new_rgba = transform(name, old_rgba)
+                if new_rgba is not None:
+                    changes.append((name, pos, old_rgba, tuple(new_rgba)))
+
+            if changes:
+                if backup:
+                    _backup_file(path)
+                for name, pos, old_rgba, new_rgba in changes:
+                    write_rgba(mm, pos, new_rgba)
+                mm.flush()
+
+    return changes
+
+
+def check_colors(data, path, changes, expected):
+    """Raise ValueError unless data holds each expected RGBA at its change's offset"""
+    for (pos, rgba), old_rgba in zip(changes, expected):
+        if bytes(data[pos:pos + RGBA_SIZE]) != pack_rgba(old_rgba):
+            raise ValueError(f"{path} changed since it was scanned (offset {pos})")
+
+
+def write_colors_in_place(path, changes, backup=False, expected=None):
+    """Memory-mapped write of (position, rgba) pairs at already known offsets
+
+    expected optionally gives the RGBA each offset should still hold; the
+    file is left untouched (ValueError) if any of them differ.
+    """
+    with open(path, 'r+b') as f:
+        with mmap.mmap(f.fileno(), 0) as mm:
+            for pos, rgba in changes:
+                if pos + RGBA_SIZE > len(mm):
+                    raise ValueError(f"Offset {pos} is past the end of {path}")
+            if expected is not None:
+                check_colors(mm, path, changes, expected)
+            if backup:
+                _backup_file(path)
+            for pos, rgba in changes:
+                write_rgba(mm, pos, rgba)
+            mm.flush()
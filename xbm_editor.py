@@ -2,11 +2,110 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, colorchooser
 import struct
 import os
-from PIL import Image, ImageTk
+import queue
+import sys
+import threading
+import time
 import webbrowser
 
+from xbm_archive import ArchiveError, DuniaArchive, entry_path, split_entry_path
+from xbm_cache import ScanCache, record_from_material
+from xbm_core import LoadCancelled, XbmMaterial, read_file, rgba_to_dict
+from xbm_library import ColorIndex, LibraryIndexer
+from xbm_log import LogBuffer
+from xbm_profiler import profiler
+from xbm_session import EditorSession
+
+try:
+    from xbm_preview import TONE_MAPPERS, PreviewRenderer
+except ImportError:  # NumPy missing: the flat color swatch is used instead
+    PreviewRenderer = None
+
+try:
+    from xbm_wheel import ColorWheel
+except ImportError:  # NumPy missing: pickers fall back to the system color dialog
+    ColorWheel = None
+
+# Minimum time between preview redraws while sliders are dragged (~60 fps)
+REDRAW_INTERVAL_MS = 16
+
+# Log lines are appended to the Operation Log in batches on this timer
+LOG_FLUSH_MS = 100
+
+# How often the UI checks on a background file load
+LOAD_POLL_MS = 30
+
+# How often the diagnostics pane refreshes its timings
+DIAGNOSTICS_REFRESH_MS = 1000
+
+# File buffers kept in memory across open documents (XBM_EDITOR_MEMORY_MB overrides)
+DEFAULT_SESSION_MEMORY_MB = 256
+
+
+def session_memory_cap():
+    """(cap in bytes, warning or None) from XBM_EDITOR_MEMORY_MB, falling back to the default"""
+    raw = os.environ.get('XBM_EDITOR_MEMORY_MB', '').strip()
+    if raw:
+        try:
+            megabytes = float(raw)
+        except ValueError:
+            megabytes = 0
+        if megabytes > 0:
+            return int(megabytes * 1024 * 1024), None
+        return (DEFAULT_SESSION_MEMORY_MB * 1024 * 1024,
+                f"⚠️ Ignoring XBM_EDITOR_MEMORY_MB={raw!r} (not a positive number of MB); "
+                f"using {DEFAULT_SESSION_MEMORY_MB} MB")
+    return DEFAULT_SESSION_MEMORY_MB * 1024 * 1024, None
+
+
+# Window icon candidates, in priority order
+ICON_PATHS = [
+    os.path.join("assets", "XBM_Color_Editor_Icon.png"),
+    os.path.join("assets", "editor_icon.png"),
+    os.path.join("assets", "editor_icon.ico"),
+    os.path.join("Background", "editor_background.png"),
+    "XBM_Color_Editor_Icon.png",  # Fallback if in root directory
+    "editor_icon.png",
+    "editor_icon.ico"
+]
+BACKGROUND_PATH = os.path.join("Background", "editor_background.png")
+
+# Pre-scaled copies of the background and icon, so later starts skip PIL entirely
+ASSET_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".xbm_color_editor", "assets")
+
+
+def prepare_scaled_image(source, size):
+    """Return the path of a cached PNG of source resized to size, creating it if needed
+
+    Runs off the UI thread. PIL is only imported when the cached copy is
+    missing; if the cache cannot be written the resized PIL image is returned.
+    """
+    stem = os.path.splitext(os.path.basename(source))[0]
+    cache_path = os.path.join(ASSET_CACHE_DIR, f"{stem}_{size[0]}x{size[1]}_{os.stat(source).st_mtime_ns}.png")
+    if os.path.exists(cache_path):
+        return cache_path
+    
+    from PIL import Image
+    image = Image.open(source).resize(size, Image.Resampling.LANCZOS)
+    try:
+        os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+        image.save(cache_path + ".tmp", format="PNG")
+        os.replace(cache_path + ".tmp", cache_path)
+        return cache_path
+    except OSError:
+        return image
+
+
+def make_photo_image(prepared):
+    """Turn a prepare_scaled_image result into a Tk image on the UI thread"""
+    if isinstance(prepared, str):
+        return tk.PhotoImage(file=prepared)  # Tk 8.6 reads PNG natively
+    from PIL import ImageTk
+    return ImageTk.PhotoImage(prepared)
+
 class ModernXBMEditor:
     def __init__(self, root):
+        self._created_at = time.perf_counter()
         self.root = root
         self.root.title("Avatar XBM Color Editor | Made By: Advanced Modding Tools | Version 2.1")
         self.root.geometry("1600x1000")
@@ -14,6 +113,13 @@ class ModernXBMEditor:
         self.root.configure(bg='#2c2c2c')
         
         self.file_path = None
+        self.material = None
+        memory_cap, self._memory_cap_warning = session_memory_cap()
+        self.session = EditorSession(memory_cap)
+        self.scan_cache = None
+        self.library_index = ColorIndex()
+        self.library_indexer = None
+        self.archives = {}
         self.file_data = None
         self.illumination_color_position = None
         self.current_colors = {'red': 0.0, 'green': 0.0, 'blue': 0.0, 'alpha': 1.0}
@@ -22,64 +128,100 @@ class ModernXBMEditor:
         self.background_image = None
         self.auto_normalize = True  # Auto-normalization toggle
         
-        # Set up window icon
-        self._setup_window_icon()
-        
-        # Setup the modern interface
-        self._setup_background_image()
-        self.setup_modern_ui()
-    
-    def _setup_window_icon(self):
-        """Set up the window icon"""
+        # Buffered operation log; set XBM_EDITOR_LOG to also write a rotating log file
         try:
-            # Try different possible icon locations - updated to use your new icon
-            icon_paths = [
-                os.path.join("assets", "XBM_Color_Editor_Icon.png"),  # Your new icon (first priority)
-                os.path.join("assets", "editor_icon.png"),
-                os.path.join("assets", "editor_icon.ico"),
-                os.path.join("Background", "editor_background.png"),
-                "XBM_Color_Editor_Icon.png",  # Fallback if in root directory
-                "editor_icon.png",
-                "editor_icon.ico"
-            ]
-            
-            for icon_path in icon_paths:
-                if os.path.exists(icon_path):
+            self.log_buffer = LogBuffer(log_file=os.environ.get('XBM_EDITOR_LOG'))
+        except OSError:
+            self.log_buffer = LogBuffer()
+        self._log_flush_pending = False
+        
+        # Background file loading state (see _start_load)
+        self._load_thread = None
+        self._load_cancel = None
+        self._load_queue = None
+        
+        # Redraw coalescing state (see request_color_update)
+        self._redraw_pending = False
+        self._color_dirty = False
+        self._last_redraw = 0.0
+        
+        # Label for the next undo step; None means a slider/entry adjustment
+        self._edit_label = None
+        self._edit_key = None
+        self.wheel_window = None
+        self.color_wheel = None
+        self._wheel_scale = 1.0
+        
+        # Build the working UI first; the background and icon are loaded after
+        # the first paint (set XBM_EDITOR_NO_IMAGES=1 to skip them entirely)
+        with profiler.timer('startup.ui'):
+            self._setup_canvas()
+            self.setup_modern_ui()
+        if not os.environ.get('XBM_EDITOR_NO_IMAGES'):
+            self.root.after_idle(lambda: self.root.after(0, self._load_deferred_images))
+        
+        self.root.bind_all('<Control-z>', lambda event: self._on_history_key(event, self.undo))
+        self.root.bind_all('<Control-y>', lambda event: self._on_history_key(event, self.redo))
+        self.root.bind_all('<Control-Shift-Z>', lambda event: self._on_history_key(event, self.redo))
+        self.root.protocol("WM_DELETE_WINDOW", self.quit_app)
+    
+    def _setup_canvas(self):
+        """Create the main canvas with a plain background"""
+        self.canvas = tk.Canvas(self.root, width=1600, height=1000, bg='#2c2c2c', highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+    
+    def _load_deferred_images(self):
+        """Prepare the scaled background and window icon on a worker thread"""
+        profiler.record('startup.first_paint', time.perf_counter() - self._created_at)
+        icon_path = next((path for path in ICON_PATHS if os.path.exists(path)), None)
+        if icon_path and icon_path.lower().endswith('.ico'):
+            try:
+                self.root.iconbitmap(icon_path)
+            except Exception:
+                pass
+            icon_path = None
+        background_path = BACKGROUND_PATH if os.path.exists(BACKGROUND_PATH) else None
+        
+        prepared = {}
+        
+        def worker():
+            for key, source, size in (('background', background_path, (1600, 1000)),
+                                      ('icon', icon_path, (32, 32))):
+                if source:
                     try:
-                        if icon_path.lower().endswith('.ico'):
-                            self.root.iconbitmap(icon_path)
-                            break
-                        elif icon_path.lower().endswith(('.png', '.jpg', '.jpeg')):
-                            icon_image = Image.open(icon_path)
-                            icon_image = icon_image.resize((32, 32), Image.Resampling.LANCZOS)
-                            icon_photo = ImageTk.PhotoImage(icon_image)
-                            self.root.iconphoto(True, icon_photo)
-                            self.window_icon = icon_photo  # Keep reference to prevent garbage collection
-                            break
+                        with profiler.timer(f'startup.{key}_image'):
+                            prepared[key] = prepare_scaled_image(source, size)
                     except Exception:
-                        continue
-        except Exception:
-            pass
+                        pass
+        
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        
+        def apply_when_ready():
+            if thread.is_alive():
+                self.root.after(LOAD_POLL_MS, apply_when_ready)
+                return
+            self._apply_deferred_images(prepared)
+        
+        apply_when_ready()
     
-    def _setup_background_image(self):
-        """Load and set up the background image"""
-        try:
-            bg_image_path = os.path.join("Background", "editor_background.png")
-            
-            if os.path.exists(bg_image_path):
-                pil_image = Image.open(bg_image_path)
-                pil_image = pil_image.resize((1600, 1000), Image.Resampling.LANCZOS)
-                self.background_image = ImageTk.PhotoImage(pil_image)
-                
-                self.canvas = tk.Canvas(self.root, width=1600, height=1000, highlightthickness=0)
-                self.canvas.pack(fill=tk.BOTH, expand=True)
-                self.canvas.create_image(0, 0, anchor=tk.NW, image=self.background_image)
-            else:
-                self.canvas = tk.Canvas(self.root, width=1600, height=1000, bg='#2c2c2c', highlightthickness=0)
-                self.canvas.pack(fill=tk.BOTH, expand=True)
-        except Exception:
-            self.canvas = tk.Canvas(self.root, width=1600, height=1000, bg='#2c2c2c', highlightthickness=0)
-            self.canvas.pack(fill=tk.BOTH, expand=True)
+    def _apply_deferred_images(self, prepared):
+        """Show the prepared background and icon"""
+        if 'background' in prepared:
+            try:
+                self.background_image = make_photo_image(prepared['background'])
+                background_item = self.canvas.create_image(0, 0, anchor=tk.NW, image=self.background_image)
+                self.canvas.tag_lower(background_item)
+            except Exception:
+                pass
+        
+        if 'icon' in prepared:
+            try:
+                icon_photo = make_photo_image(prepared['icon'])
+                self.root.iconphoto(True, icon_photo)
+                self.window_icon = icon_photo  # Keep reference to prevent garbage collection
+            except Exception:
+                pass
     
     def setup_modern_ui(self):
         """Create the modern UI layout"""
@@ -141,6 +283,18 @@ class ModernXBMEditor:
                                   insertbackground='white', relief='solid', bd=1, state='readonly')
         self.file_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(10, 10))
         
+        # Open documents; picking one switches to it without reopening the file
+        self.document_var = tk.StringVar()
+        self.document_combo = ttk.Combobox(path_frame, textvariable=self.document_var,
+                                           state='readonly', width=26, font=('Segoe UI', 9))
+        self.document_combo.pack(side=tk.LEFT, padx=(0, 5))
+        self.document_combo.bind('<<ComboboxSelected>>', self.on_document_selected)
+        
+        self.close_doc_btn = tk.Button(path_frame, text="✖", command=self.close_document,
+                                      bg='#555555', fg='white', font=('Segoe UI', 9),
+                                      relief='flat', padx=6, cursor='hand2', state='disabled')
+        self.close_doc_btn.pack(side=tk.LEFT)
+        
         # Buttons
         button_frame = tk.Frame(file_frame, bg='#3a3a3a')
         button_frame.pack(fill=tk.X, padx=15, pady=(0, 10))
@@ -161,11 +315,28 @@ class ModernXBMEditor:
                                  cursor='hand2', state='disabled')
         self.save_btn.pack(side=tk.LEFT, padx=(0, 10))
         
+        self.library_btn = tk.Button(button_frame, text="📚 Material Library", 
+                                    command=self.open_library_browser,
+                                    bg='#6f42c1', fg='white',
+                                    font=('Segoe UI', 10, 'bold'),
+                                    relief='flat', padx=20, pady=8,
+                                    cursor='hand2')
+        self.library_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
         # Status
         self.file_status = tk.Label(button_frame, text="No file loaded",
                                    bg='#3a3a3a', fg='#bbbbbb',
                                    font=('Segoe UI', 9))
         self.file_status.pack(side=tk.LEFT, padx=(20, 0))
+        
+        # Load progress and cancel, only shown while a file is loading
+        self.load_progress = ttk.Progressbar(button_frame, mode='determinate', length=90, maximum=100)
+        self.cancel_load_btn = tk.Button(button_frame, text="✖ Cancel",
+                                        command=self.cancel_load,
+                                        bg='#dc3545', fg='white',
+                                        font=('Segoe UI', 9),
+                                        relief='flat', padx=8, pady=4,
+                                        cursor='hand2')
     
     def _create_color_editor_section(self):
         """Create modern color editor section"""
@@ -262,6 +433,22 @@ class ModernXBMEditor:
                                        cursor='hand2', state='disabled')
         self.hdr_picker_btn.pack(side=tk.LEFT, padx=(0, 10))
         
+        self.redo_btn = tk.Button(picker_frame1, text="↷ Redo",
+                                 command=self.redo,
+                                 bg='#4B4B4B', fg='white',
+                                 font=('Segoe UI', 9),
+                                 relief='flat', padx=15, pady=6,
+                                 cursor='hand2', state='disabled')
+        self.redo_btn.pack(side=tk.RIGHT)
+        
+        self.undo_btn = tk.Button(picker_frame1, text="↶ Undo",
+                                 command=self.undo,
+                                 bg='#4B4B4B', fg='white',
+                                 font=('Segoe UI', 9),
+                                 relief='flat', padx=15, pady=6,
+                                 cursor='hand2', state='disabled')
+        self.undo_btn.pack(side=tk.RIGHT, padx=(0, 10))
+        
         # Action buttons row 2
         action_frame2 = tk.Frame(action_frame, bg='#3a3a3a')
         action_frame2.pack(fill=tk.X)
@@ -304,7 +491,7 @@ class ModernXBMEditor:
         
         # Variable
         var = tk.DoubleVar()
-        var.trace('w', self.on_color_change)  # More responsive tracking
+        var.trace('w', self.request_color_update)  # Coalesced into one redraw per frame
         self.color_vars[color_name] = var
         
         # Modern slider
@@ -341,10 +528,51 @@ class ModernXBMEditor:
         content_frame.pack(fill=tk.BOTH, expand=True, padx=15, pady=(0, 15))
         
         # Large color preview
-        self.large_color_display = tk.Canvas(content_frame, width=230, height=230, 
+        preview_column = tk.Frame(content_frame, bg='#3a3a3a')
+        preview_column.pack(side=tk.LEFT, anchor=tk.N, padx=(0, 20))
+        
+        self.large_color_display = tk.Canvas(preview_column, width=230, height=230, 
                                             bg='gray', highlightthickness=2,
                                             highlightbackground='#666666')
-        self.large_color_display.pack(side=tk.LEFT, padx=(0, 20))
+        self.large_color_display.pack()
+        
+        # Persistent preview items, updated in place by update_color_displays
+        self.large_color_rect = self.large_color_display.create_rectangle(10, 10, 220, 220, 
+                                                                          fill='gray', outline='#666666', width=2)
+        self._shown_preview = None
+        
+        # Tone-mapped sphere lit by the raw HDR color, drawn over the flat swatch
+        self.preview_renderer = PreviewRenderer(210, 210) if PreviewRenderer else None
+        if self.preview_renderer:
+            self.preview_photo = tk.PhotoImage(width=210, height=210)
+            self.large_color_display.create_image(11, 11, anchor=tk.NW, image=self.preview_photo)
+            text_y = 205
+        else:
+            text_y = 115
+        
+        self.large_color_text = self.large_color_display.create_text(115, text_y, text="", 
+                                                                     fill='white', font=('Consolas', 12, 'bold'),
+                                                                     justify=tk.CENTER)
+        
+        if self.preview_renderer:
+            controls = tk.Frame(preview_column, bg='#3a3a3a')
+            controls.pack(fill=tk.X, pady=(8, 0))
+            
+            tk.Label(controls, text="Tone map:", font=('Segoe UI', 9),
+                    fg='#dddddd', bg='#3a3a3a').pack(side=tk.LEFT)
+            
+            self.tone_map_var = tk.StringVar(value=self.preview_renderer.mode)
+            tone_combo = ttk.Combobox(controls, textvariable=self.tone_map_var, values=TONE_MAPPERS,
+                                      state='readonly', width=9)
+            tone_combo.pack(side=tk.LEFT, padx=(5, 10))
+            tone_combo.bind('<<ComboboxSelected>>', self.on_preview_settings_changed)
+            
+            self.bloom_var = tk.BooleanVar(value=self.preview_renderer.use_bloom)
+            tk.Checkbutton(controls, text="Bloom", variable=self.bloom_var,
+                          command=self.on_preview_settings_changed,
+                          font=('Segoe UI', 9), fg='#dddddd', bg='#3a3a3a',
+                          selectcolor='#2c2c2c', activebackground='#3a3a3a',
+                          activeforeground='white').pack(side=tk.LEFT)
         
         # Info panel
         info_panel = tk.Frame(content_frame, bg='#3a3a3a')
@@ -381,9 +609,18 @@ class ModernXBMEditor:
         self.log_window = self.canvas.create_window(840, 600, anchor=tk.NW, window=log_frame, width=700, height=250)
         
         # Title
-        title_label = tk.Label(log_frame, text="📋 Operation Log", 
+        title_row = tk.Frame(log_frame, bg='#3a3a3a')
+        title_row.pack(fill=tk.X, padx=15, pady=(10, 5))
+        
+        title_label = tk.Label(title_row, text="📋 Operation Log", 
                               font=('Segoe UI', 12, 'bold'), fg='white', bg='#3a3a3a')
-        title_label.pack(anchor=tk.W, padx=15, pady=(10, 5))
+        title_label.pack(side=tk.LEFT)
+        
+        # Diagnostics are only offered when profiling is enabled
+        if profiler.enabled:
+            tk.Button(title_row, text="📈 Diagnostics", command=self.open_diagnostics,
+                     bg='#17a2b8', fg='white', font=('Segoe UI', 9),
+                     relief='flat', padx=10, cursor='hand2').pack(side=tk.RIGHT)
         
         # Log text area with scrollbar
         log_content_frame = tk.Frame(log_frame, bg='#3a3a3a')
@@ -404,6 +641,8 @@ class ModernXBMEditor:
         self.log_message("✨ New Features: Smart auto-normalization, HDR color picker, hex copy")
         self.log_message("💡 Auto-normalization: Intelligently manages HDR values for optimal display")
         self.log_message("📂 Open an XBM file to begin editing IlluminationColor1 values")
+        if self._memory_cap_warning:
+            self.log_message(self._memory_cap_warning)
     
     def _create_footer_section(self):
         """Create modern footer section"""
@@ -496,18 +735,44 @@ class ModernXBMEditor:
     
     def on_slider_change(self, value):
         """Handle slider changes"""
-        # Prevent recursive calls during programmatic updates
-        if not hasattr(self, '_updating_sliders'):
-            self.on_color_change()
+        self.request_color_update()
     
     def on_entry_change(self, event=None):
         """Handle entry field changes"""
+        self.request_color_update()
+    
+    def request_color_update(self, *args):
+        """Schedule a redraw, collapsing bursts of slider/variable events into one per frame"""
         # Prevent recursive calls during programmatic updates
-        if not hasattr(self, '_updating_sliders'):
+        if hasattr(self, '_updating_sliders'):
+            return
+        
+        self._color_dirty = True
+        if self._redraw_pending:
+            return
+        
+        self._redraw_pending = True
+        elapsed_ms = (time.perf_counter() - self._last_redraw) * 1000
+        if elapsed_ms >= REDRAW_INTERVAL_MS:
+            self.root.after_idle(self._flush_color_update)
+        else:
+            self.root.after(int(REDRAW_INTERVAL_MS - elapsed_ms) + 1, self._flush_color_update)
+    
+    def _flush_color_update(self):
+        """Run the pending redraw scheduled by request_color_update"""
+        self._redraw_pending = False
+        if self._color_dirty:
+            self._color_dirty = False
+            self._last_redraw = time.perf_counter()
             self.on_color_change()
     
     def on_color_change(self, *args):
         """Handle color changes with smart auto-normalization"""
+        with profiler.timer('redraw.color_change'):
+            self._apply_color_change()
+    
+    def _apply_color_change(self):
+        """Recompute HDR state and refresh previews and info from the color variables"""
         if not hasattr(self, 'color_vars') or not self.color_vars:
             return
         
@@ -525,7 +790,9 @@ class ModernXBMEditor:
             a = self.color_vars['alpha'].get()
             
             # Store raw values (these are what get saved to file)
+            previous_colors = self.current_colors
             self.current_colors = {'red': r, 'green': g, 'blue': b, 'alpha': a}
+            self._record_color_edit(previous_colors)
             
             # Calculate HDR scale
             max_rgb = max(r, g, b)
@@ -539,7 +806,7 @@ class ModernXBMEditor:
                 display_b = b / max_rgb
                 
                 # Update HDR indicator
-                self.hdr_indicator.config(text=f"HDR ({max_rgb:.2f}x) - Auto", fg='#ff8c00')
+                self._set_hdr_indicator(f"HDR ({max_rgb:.2f}x) - Auto", '#ff8c00')
                 
                 # Log the normalization when it first kicks in
                 if not hasattr(self, '_last_auto_norm_state') or not self._last_auto_norm_state:
@@ -552,9 +819,9 @@ class ModernXBMEditor:
                 display_r, display_g, display_b = r, g, b
                 
                 if max_rgb > 1.0:
-                    self.hdr_indicator.config(text=f"HDR ({max_rgb:.2f}x) - Raw", fg='#dc3545')
+                    self._set_hdr_indicator(f"HDR ({max_rgb:.2f}x) - Raw", '#dc3545')
                 else:
-                    self.hdr_indicator.config(text="SDR (1.0x)", fg='#28a745')
+                    self._set_hdr_indicator("SDR (1.0x)", '#28a745')
                 
                 # Reset auto-norm state
                 if hasattr(self, '_last_auto_norm_state') and self._last_auto_norm_state:
@@ -567,6 +834,8 @@ class ModernXBMEditor:
             
             # Update info displays with raw values
             self.update_info_displays(r, g, b, a)
+            
+            self._sync_color_wheel()
         
         except (ValueError, tk.TclError):
             # Handle invalid input gracefully
@@ -576,8 +845,33 @@ class ModernXBMEditor:
             if hasattr(self, '_updating_colors'):
                 delattr(self, '_updating_colors')
     
+    def _set_hdr_indicator(self, text, color):
+        """Reconfigure the HDR status label only when its text or color changes"""
+        if self.hdr_indicator.cget('text') != text or self.hdr_indicator.cget('fg') != color:
+            self.hdr_indicator.config(text=text, fg=color)
+    
+    def on_preview_settings_changed(self, event=None):
+        """Re-render the HDR preview with the chosen tone mapper and bloom setting"""
+        self.preview_renderer.mode = self.tone_map_var.get()
+        self.preview_renderer.use_bloom = self.bloom_var.get()
+        self.preview_renderer.invalidate()
+        self._render_hdr_preview()
+    
+    def _render_hdr_preview(self):
+        """Redraw the tone-mapped sphere from the raw (unclamped) color"""
+        if not self.preview_renderer:
+            return
+        rgb = (self.current_colors['red'], self.current_colors['green'], self.current_colors['blue'])
+        with profiler.timer('redraw.hdr_preview'):
+            ppm = self.preview_renderer.render_ppm(rgb)
+            if ppm is not None:
+                self.preview_photo.configure(data=ppm, format='PPM')
+    
     def update_color_displays(self, r, g, b):
         """Update color preview displays with proper clamping"""
+        # The HDR sphere follows the raw values, which the flat swatch clamps away
+        self._render_hdr_preview()
+        
         # Clamp values for display (0-1 range only)
         r_clamped = max(0, min(1, r))
         g_clamped = max(0, min(1, g))
@@ -590,29 +884,30 @@ class ModernXBMEditor:
         
         color_hex = f"#{r_int:02x}{g_int:02x}{b_int:02x}"
         
-        # Update small preview
-        self.color_display.config(bg=color_hex)
-        
-        # Update large preview
-        self.large_color_display.config(bg=color_hex)
-        self.large_color_display.delete("all")
-        
-        # Create color square with border
-        self.large_color_display.create_rectangle(10, 10, 220, 220, 
-                                                 fill=color_hex, outline='#666666', width=2)
-        
         # Add hex value overlay
         brightness = (r_int + g_int + b_int) / 3
         text_color = 'white' if brightness < 128 else 'black'
+        if self.preview_renderer:
+            text_color = '#dddddd'  # Drawn over the dark sphere backdrop
         
         # Show if this is normalized or raw
         display_text = color_hex.upper()
         if self.auto_normalize and max(self.current_colors['red'], self.current_colors['green'], self.current_colors['blue']) > 1.0:
             display_text += "\n(Auto-Norm)"
         
-        self.large_color_display.create_text(115, 115, text=display_text, 
-                                            fill=text_color, font=('Consolas', 12, 'bold'),
-                                            justify=tk.CENTER)
+        # Only touch the canvases when what they show actually changes
+        shown = (color_hex, display_text, text_color)
+        if shown == self._shown_preview:
+            return
+        self._shown_preview = shown
+        
+        # Update small preview
+        self.color_display.config(bg=color_hex)
+        
+        # Update large preview items in place
+        self.large_color_display.config(bg=color_hex)
+        self.large_color_display.itemconfig(self.large_color_rect, fill=color_hex)
+        self.large_color_display.itemconfig(self.large_color_text, text=display_text, fill=text_color)
     
     def update_info_displays(self, r, g, b, a):
         """Update information displays with raw values"""
@@ -639,90 +934,332 @@ class ModernXBMEditor:
         color_info = f"Raw RGB: {r:.3f}, {g:.3f}, {b:.3f}\nAlpha: {a:.3f}\nHDR Scale: {self.hdr_scale:.3f}x\n{norm_note}\nHex Bytes:\n  R: {r_bytes}\n  G: {g_bytes}\n  B: {b_bytes}\n  A: {a_bytes}"
         self.color_info_label.config(text=color_info)
     
-    def open_file(self):
-        """Open XBM file"""
-        file_path = filedialog.askopenfilename(
-            title="Open Avatar XBM File",
-            filetypes=[("XBM files", "*.xbm"), ("All files", "*.*")]
-        )
+    def open_file(self, file_path=None):
+        """Open XBM file(s) (asks for them when no path is given)"""
+        if not file_path:
+            file_paths = filedialog.askopenfilenames(
+                title="Open Avatar XBM Files",
+                filetypes=[("XBM files", "*.xbm"), ("Dunia archives", "*.fat"), ("All files", "*.*")]
+            )
+            if not file_paths:
+                return
+            if file_paths[0].lower().endswith('.fat'):
+                self.open_archive_browser(file_paths[0])
+                return
+            # Extra files join the session unloaded; their buffers are read when first shown
+            for path in file_paths[1:]:
+                self.session.open(path)
+            if len(file_paths) > 1:
+                self.log_message(f"📑 Added {len(file_paths) - 1} more files to the session")
+                self._refresh_document_list()
+            file_path = file_paths[0]
         
         if file_path:
+            document = self.session.get(file_path)
+            if document is not None and document.loaded:
+                self.switch_document(document)
+                return
+            
+            # Show the cached colors straight away when the file is unchanged
+            cache = self._get_scan_cache()
+            cached = cache.lookup(file_path) if cache else None
+            if cached and cached.rgba:
+                r, g, b, a = cached.rgba
+                self.log_message(f"⚡ Cached colors - R:{r:.3f} G:{g:.3f} B:{b:.3f} A:{a:.3f} at position {cached.position}")
+            
+            self._start_load(file_path)
+    
+    def _start_load(self, file_path):
+        """Read and scan a file on a worker thread; results come back through _poll_load"""
+        archive_entry = split_entry_path(file_path)
+        if archive_entry and self._get_archive(archive_entry[0]) is None:
+            return
+        
+        if self._load_thread is not None and self._load_thread.is_alive():
+            self._load_cancel.set()
+        
+        cancel = threading.Event()
+        results = queue.Queue()
+        
+        def worker():
             try:
-                with open(file_path, 'rb') as f:
-                    self.file_data = bytearray(f.read())
+                if archive_entry:
+                    # Entries are read straight out of the .dat; the scan cache only covers loose files
+                    with profiler.timer('load.read'):
+                        material = self.archives[archive_entry[0]].read_material(archive_entry[1])
+                    material.path = file_path
+                    results.put(('done', material, None))
+                    return
+                # Stat before reading: a write in between then leaves an older
+                # stamp that misses next time, never new stamp on old colors
+                st = os.stat(file_path)
+                with profiler.timer('load.read'):
+                    data = read_file(
+                        file_path,
+                        progress=lambda done, total: results.put(('progress', done, total)),
+                        cancelled=cancel.is_set
+                    )
+                with profiler.timer('load.scan'):
+                    material = XbmMaterial(data, file_path)
+                    # Scan the remaining color parameters here rather than on the UI thread
+                    material.color_parameters
+                record = record_from_material(material, st)
+                results.put(('done', material, record))
+            except LoadCancelled:
+                results.put(('cancelled',))
+            except Exception as e:
+                results.put(('error', e))
+        
+        self._load_cancel = cancel
+        self._load_queue = results
+        self._load_thread = threading.Thread(target=worker, daemon=True)
+        self._load_thread.start()
+        
+        self.load_progress.config(value=0)
+        self.load_progress.pack(side=tk.LEFT, padx=(10, 5))
+        self.cancel_load_btn.pack(side=tk.LEFT)
+        self.file_status.config(text=f"Loading {os.path.basename(file_path)}...", fg='#bbbbbb')
+        self.update_status(f"Loading: {os.path.basename(file_path)}")
+        
+        self.root.after(LOAD_POLL_MS, self._poll_load, file_path, results)
+    
+    def cancel_load(self):
+        """Cancel the file load in progress"""
+        if self._load_cancel is not None:
+            self._load_cancel.set()
+    
+    def _poll_load(self, file_path, results):
+        """Apply messages from the load worker on the UI thread"""
+        if results is not self._load_queue:
+            return  # Superseded by a newer load
+        
+        try:
+            while True:
+                message = results.get_nowait()
+                kind = message[0]
+                if kind == 'progress':
+                    done, total = message[1], message[2]
+                    self.load_progress.config(value=100.0 * done / total if total else 100)
+                    continue
                 
-                self.file_path = file_path
-                filename = os.path.basename(file_path)
+                self._end_load()
+                if kind == 'done':
+                    self._finish_load(file_path, message[1], message[2])
+                elif kind == 'cancelled':
+                    self.file_status.config(text="Load cancelled", fg='#bbbbbb')
+                    self.update_status("Load cancelled")
+                    self.log_message(f"✖ Cancelled loading: {os.path.basename(file_path)}")
+                else:
+                    self.file_status.config(text="Load failed", fg='#dc3545')
+                    messagebox.showerror("Error", f"Failed to open file: {str(message[1])}")
+                    self.log_message(f"❌ Error loading file: {str(message[1])}")
+                return
+        except queue.Empty:
+            pass
+        
+        self.root.after(LOAD_POLL_MS, self._poll_load, file_path, results)
+    
+    def _end_load(self):
+        """Hide the load progress controls"""
+        self._load_queue = None
+        self._load_cancel = None
+        self.load_progress.pack_forget()
+        self.cancel_load_btn.pack_forget()
+    
+    def _finish_load(self, file_path, material, record):
+        """Show a material loaded by the worker thread"""
+        try:
+            self._stash_current_edits()
+            document = self.session.get(file_path)
+            if document is None or document.material is not material:
+                document = self.session.attach(file_path, material)
+            self.session.activate(document)
+            self.material = material
+            self.file_data = self.material.data
+            self._refresh_document_list()
+            cache = self._get_scan_cache()
+            if cache and record is not None:
+                try:
+                    cache.store(record)
+                    cache.commit()
+                except Exception:
+                    pass
+            
+            self.file_path = file_path
+            filename = os.path.basename(file_path)
+            
+            # Update file entry
+            self.file_entry.config(state='normal')
+            self.file_entry.delete(0, tk.END)
+            self.file_entry.insert(0, file_path)
+            self.file_entry.config(state='readonly')
+            
+            if self.find_illumination_color():
+                self.load_current_colors()
+                self.enable_controls()
                 
-                # Update file entry
-                self.file_entry.config(state='normal')
-                self.file_entry.delete(0, tk.END)
-                self.file_entry.insert(0, file_path)
-                self.file_entry.config(state='readonly')
+                # Update status
+                self.file_status.config(text=f"✓ {filename}", fg='#28a745')
+                self.update_status(f"File loaded: {filename}")
                 
-                if self.find_illumination_color():
-                    self.load_current_colors()
-                    self.enable_controls()
-                    
-                    # Update status
-                    self.file_status.config(text=f"✓ {filename}", fg='#28a745')
-                    self.update_status(f"File loaded: {filename}")
-                    
-                    # Update file info
-                    file_size = len(self.file_data)
-                    file_info = f"Filename: {filename}\nSize: {file_size:,} bytes\nType: Avatar XBM File"
-                    self.file_info_label.config(text=file_info)
-                    
-                    # Update pattern info
-                    pattern_info = f"Position: {self.illumination_color_position}\nPattern: IlluminationColor1\nStatus: Found ✓"
-                    self.pattern_info_label.config(text=pattern_info)
-                    
-                    self.log_message(f"✅ Successfully loaded: {filename}")
-                    self.log_message(f"📍 IlluminationColor1 found at position {self.illumination_color_position}")
-                    
-                else:
-                    messagebox.showwarning("Warning", "IlluminationColor1 pattern not found in file!")
-                    self.log_message("⚠️ Warning: IlluminationColor1 pattern not found!")
-                    self.pattern_info_label.config(text="Position: -\nPattern: IlluminationColor1\nStatus: Not found ❌")
+                # Update file info
+                file_size = len(self.file_data)
+                file_info = f"Filename: {filename}\nSize: {file_size:,} bytes\nType: Avatar XBM File"
+                self.file_info_label.config(text=file_info)
+                
+                # Update pattern info
+                pattern_info = f"Position: {self.illumination_color_position}\nPattern: IlluminationColor1\nStatus: Found ✓"
+                self.pattern_info_label.config(text=pattern_info)
+                
+                self.log_message(f"✅ Successfully loaded: {filename}")
+                self.log_message(f"📍 IlluminationColor1 found at position {self.illumination_color_position}")
                 
+                other_params = [p for p in self.material.color_parameters
+                                if p.position != self.illumination_color_position]
+                if other_params:
+                    names = ", ".join(f"{p.name}@{p.position}" for p in other_params)
+                    self.log_message(f"🔍 Other color parameters: {names}")
+                
+            else:
+                self.file_status.config(text=f"⚠ {filename}", fg='#ff8c00')
+                messagebox.showwarning("Warning", "IlluminationColor1 pattern not found in file!")
+                self.log_message("⚠️ Warning: IlluminationColor1 pattern not found!")
+                self.pattern_info_label.config(text="Position: -\nPattern: IlluminationColor1\nStatus: Not found ❌")
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to open file: {str(e)}")
+            self.log_message(f"❌ Error loading file: {str(e)}")
+    
+    def _get_archive(self, fat_path):
+        """Open a .fat/.dat archive once per session (None if it cannot be read)"""
+        archive = self.archives.get(fat_path)
+        if archive is None:
+            try:
+                archive = self.archives[fat_path] = DuniaArchive(fat_path)
+            except (OSError, ArchiveError) as e:
+                messagebox.showerror("Error", f"Failed to open archive: {str(e)}")
+                self.log_message(f"❌ Error opening archive: {str(e)}")
+                return None
+            self.log_message(f"🗜️ Opened archive {os.path.basename(fat_path)}: "
+                             f"{len(archive)} entries, {len(archive.names)} names known")
+        return archive
+    
+    def open_archive_browser(self, fat_path):
+        """Pick a material inside a Dunia .fat/.dat archive without extracting it"""
+        archive = self._get_archive(fat_path)
+        if archive is None:
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"Archive - {os.path.basename(fat_path)}")
+        dialog.geometry("700x520")
+        dialog.configure(bg='#2c2c2c')
+        dialog.transient(self.root)
+        dialog.geometry("+{}+{}".format(
+            self.root.winfo_rootx() + 840,
+            self.root.winfo_rooty() + 170
+        ))
+        
+        main_frame = tk.Frame(dialog, bg='#3a3a3a', relief='solid', bd=1)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        tk.Label(main_frame, text="🗜️ Archive Materials", 
+                font=('Segoe UI', 14, 'bold'), fg='white', bg='#3a3a3a').pack(anchor=tk.W, padx=15, pady=(10, 10))
+        
+        filter_frame = tk.Frame(main_frame, bg='#3a3a3a')
+        filter_frame.pack(fill=tk.X, padx=15, pady=(0, 10))
+        
+        text_var = tk.StringVar(value="")
+        tk.Label(filter_frame, text="Name", 
+                font=('Segoe UI', 9), fg='#dddddd', bg='#3a3a3a').pack(side=tk.LEFT, padx=(0, 4))
+        tk.Entry(filter_frame, textvariable=text_var, width=40, font=('Consolas', 9),
+                bg='#2c2c2c', fg='white', insertbackground='white', relief='flat').pack(side=tk.LEFT)
+        
+        results_frame = tk.Frame(main_frame, bg='#3a3a3a')
+        results_frame.pack(fill=tk.BOTH, expand=True, padx=15, pady=(0, 10))
+        
+        tree = ttk.Treeview(results_frame, columns=('entry', 'rgba'), show='headings', height=16)
+        tree.heading('entry', text="Entry")
+        tree.heading('rgba', text="Raw RGBA (once scanned)")
+        tree.column('entry', width=400)
+        tree.column('rgba', width=220)
+        scrollbar = tk.Scrollbar(results_frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        status_label = tk.Label(main_frame, text="", 
+                               font=('Segoe UI', 9), fg='#bbbbbb', bg='#3a3a3a')
+        status_label.pack(anchor=tk.W, padx=15)
+        
+        max_rows = 1000
+        # Without a file list every entry is a candidate; named lists show only .xbm files
+        entries = list(archive.iter_entries('*.xbm', include_unnamed=not archive.names))
+        
+        def refresh_results(*args):
+            text = text_var.get().lower()
+            tree.delete(*tree.get_children())
+            shown = 0
+            for entry, name in entries:
+                if text and text not in name.lower():
+                    continue
+                found = archive.colors.get(entry.name_hash)
+                rgba_text = ", ".join(f"{v:.3f}" for v in found[1]) if found else ""
+                tree.insert('', tk.END, iid=name, values=(name, rgba_text))
+                shown += 1
+                if shown >= max_rows:
+                    break
+            status_label.config(text=f"{len(entries)} entries (showing {shown})")
+        
+        def open_selected(event=None):
+            selection = tree.selection()
+            if selection:
+                self.open_file(entry_path(fat_path, selection[0]))
+        
+        text_var.trace('w', refresh_results)
+        tree.bind('<Double-1>', open_selected)
+        refresh_results()
+    
+    def _get_scan_cache(self):
+        """Open the persistent scan cache on first use (None if unavailable)"""
+        if self.scan_cache is None:
+            try:
+                self.scan_cache = ScanCache()
             except Exception as e:
-                messagebox.showerror("Error", f"Failed to open file: {str(e)}")
-                self.log_message(f"❌ Error loading file: {str(e)}")
+                self.scan_cache = False
+                self.log_message(f"⚠️ Scan cache unavailable: {str(e)}")
+        return self.scan_cache or None
+    
+    def _store_scan_record(self, path):
+        """Record the loaded material in the scan cache"""
+        cache = self._get_scan_cache()
+        if cache:
+            try:
+                cache.store(record_from_material(self.material, os.stat(path)))
+                cache.commit()
+            except Exception:
+                pass
     
     def find_illumination_color(self):
         """Find IlluminationColor1 pattern"""
-        pattern = b'\x49\x6C\x6C\x75\x6D\x69\x6E\x61\x74\x69\x6F\x6E\x43\x6F\x6C\x6F\x72\x31'
-        
-        pos = self.file_data.find(pattern)
-        if pos != -1:
-            search_start = pos + len(pattern)
-            null_pos = self.file_data.find(b'\x00', search_start)
-            
-            if null_pos != -1:
-                self.illumination_color_position = null_pos + 1
-                return True
+        if self.material is not None and self.material.has_color:
+            self.illumination_color_position = self.material.illumination_color_position
+            return True
         
         return False
     
     def load_current_colors(self):
         """Load color values from file"""
-        if self.illumination_color_position and len(self.file_data) >= self.illumination_color_position + 16:
-            pos = self.illumination_color_position
-            
-            # Read RGBA values
-            red_bytes = self.file_data[pos:pos+4]
-            green_bytes = self.file_data[pos+4:pos+8]
-            blue_bytes = self.file_data[pos+8:pos+12]
-            alpha_bytes = self.file_data[pos+12:pos+16]
-            
-            r = struct.unpack('<f', red_bytes)[0]
-            g = struct.unpack('<f', green_bytes)[0]
-            b = struct.unpack('<f', blue_bytes)[0]
-            a = struct.unpack('<f', alpha_bytes)[0]
+        if self.material and self.material.has_color:
+            document = self.session.current
+            if document is not None and document.rgba is not None:
+                original, (r, g, b, a) = document.original, document.rgba
+            else:
+                original = (r, g, b, a) = self.material.get_color()
             
-            # Store original and current values
-            self.original_colors = {'red': r, 'green': g, 'blue': b, 'alpha': a}
-            self.current_colors = self.original_colors.copy()
+            # Store original and current (possibly edited) values
+            self.original_colors = rgba_to_dict(original)
+            self.current_colors = rgba_to_dict((r, g, b, a))
             
             # Prevent change events during loading
             self._updating_sliders = True
@@ -759,9 +1296,110 @@ class ModernXBMEditor:
         self.reset_btn.config(state='normal')
         self.normalize_btn.config(state='normal')
         self.copy_hex_btn.config(state='normal')
+        self._update_history_buttons()
+    
+    def disable_controls(self):
+        """Disable controls when no file is shown"""
+        self.save_btn.config(state='disabled')
+        self.color_picker_btn.config(state='disabled')
+        self.hdr_picker_btn.config(state='disabled')
+        self.reset_btn.config(state='disabled')
+        self.normalize_btn.config(state='disabled')
+        self.copy_hex_btn.config(state='disabled')
+        self.undo_btn.config(state='disabled')
+        self.redo_btn.config(state='disabled')
+    
+    def _stash_current_edits(self):
+        """Keep the slider values on the current document before showing another"""
+        document = self.session.current
+        if document is not None and document.original is not None and hasattr(self, 'color_vars'):
+            document.history.break_coalescing()
+            try:
+                document.rgba = tuple(self.color_vars[key].get() for key in ('red', 'green', 'blue', 'alpha'))
+            except (ValueError, tk.TclError):
+                pass
+    
+    def _refresh_document_list(self):
+        """Rebuild the open documents list, marking unsaved ones with *"""
+        labels = [f"{i + 1}. {doc.name}{' *' if doc.dirty else ''}"
+                  for i, doc in enumerate(self.session)]
+        self.document_combo.config(values=labels)
+        current = self.session.current
+        if current is not None and current.path in self.session:
+            self.document_combo.current(self.session.index(current))
+        else:
+            self.document_var.set(f"{len(labels)} open" if labels else "")
+        self.close_doc_btn.config(state='normal' if labels else 'disabled')
+    
+    def on_document_selected(self, event=None):
+        """Switch to the document picked in the list"""
+        index = self.document_combo.current()
+        documents = list(self.session)
+        if 0 <= index < len(documents) and documents[index] is not self.session.current:
+            self.switch_document(documents[index])
+    
+    def switch_document(self, document):
+        """Show another open document, reading its file only if its buffer was evicted"""
+        if document.loaded:
+            self._finish_load(document.path, document.material, None)
+        else:
+            self._start_load(document.path)
+    
+    def close_document(self):
+        """Close the current document, asking first when it has unsaved changes"""
+        document = self.session.current
+        if document is None:
+            return
+        self._stash_current_edits()
+        if document.dirty and not messagebox.askyesno(
+                "Unsaved Changes", f"{document.name} has unsaved color changes.\n\nClose it anyway?"):
+            return
+        
+        index = self.session.index(document)
+        self.session.close(document)
+        self.log_message(f"📑 Closed: {document.name}")
+        
+        remaining = list(self.session)
+        if remaining:
+            self.switch_document(remaining[min(index, len(remaining) - 1)])
+            return
+        
+        self.material = None
+        self.file_data = None
+        self.file_path = None
+        self.illumination_color_position = None
+        self.file_entry.config(state='normal')
+        self.file_entry.delete(0, tk.END)
+        self.file_entry.config(state='readonly')
+        self.file_status.config(text="No file loaded", fg='#bbbbbb')
+        self.disable_controls()
+        self._refresh_document_list()
+        self.update_status("Ready - Open an XBM file to begin")
+    
+    def quit_app(self):
+        """Close the editor, listing every document with unsaved changes first"""
+        self._stash_current_edits()
+        dirty = self.session.dirty_documents()
+        if dirty:
+            names = "\n".join(f"• {doc.name}" for doc in dirty[:10])
+            if len(dirty) > 10:
+                names += f"\n… and {len(dirty) - 10} more"
+            if not messagebox.askyesno(
+                    "Unsaved Changes",
+                    f"{len(dirty)} open document(s) have unsaved color changes:\n\n{names}\n\nQuit anyway?"):
+                return
+        if self._load_cancel is not None:
+            self._load_cancel.set()
+        if self.library_indexer is not None:
+            self.library_indexer.stop()
+        self.root.destroy()
     
     def pick_color(self):
         """Open standard color picker (0-1 range)"""
+        if ColorWheel:
+            self.open_color_wheel()
+            return
+        
         # Get current values for color picker
         r = self.color_vars['red'].get()
         g = self.color_vars['green'].get()
@@ -794,6 +1432,7 @@ class ModernXBMEditor:
             final_g = (g_new / 255.0) * preserve_hdr_scale
             final_b = (b_new / 255.0) * preserve_hdr_scale
             
+            self._edit_label = "Standard color"
             self.color_vars['red'].set(final_r)
             self.color_vars['green'].set(final_g)
             self.color_vars['blue'].set(final_b)
@@ -804,6 +1443,76 @@ class ModernXBMEditor:
             else:
                 self.log_message(f"📏 Color values: R:{final_r:.3f} G:{final_g:.3f} B:{final_b:.3f}")
     
+    def open_color_wheel(self):
+        """Show the non-blocking color wheel window; picks are applied live"""
+        if self.wheel_window is not None:
+            self.wheel_window.deiconify()
+            self.wheel_window.lift()
+            return
+        
+        self.wheel_window = tk.Toplevel(self.root)
+        self.wheel_window.title("Color Wheel")
+        self.wheel_window.configure(bg='#2c2c2c')
+        self.wheel_window.transient(self.root)
+        self.wheel_window.resizable(False, False)
+        self.wheel_window.geometry("+{}+{}".format(
+            self.root.winfo_rootx() + 90,
+            self.root.winfo_rooty() + 300
+        ))
+        
+        main_frame = tk.Frame(self.wheel_window, bg='#3a3a3a', relief='solid', bd=1)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        tk.Label(main_frame, text="🎨 Standard Color (0-1 Range)",
+                font=('Segoe UI', 11, 'bold'), fg='white', bg='#3a3a3a').pack(padx=15, pady=(10, 10))
+        
+        self.color_wheel = ColorWheel(main_frame, size=200, command=self._on_wheel_pick)
+        self.color_wheel.pack(padx=15)
+        
+        tk.Label(main_frame, text="Click or drag to pick • HDR colors keep their intensity",
+                font=('Segoe UI', 8), fg='#bbbbbb', bg='#3a3a3a').pack(padx=15, pady=(8, 10))
+        
+        def close_wheel():
+            self.wheel_window.destroy()
+            self.wheel_window = None
+            self.color_wheel = None
+        
+        self.wheel_window.protocol("WM_DELETE_WINDOW", close_wheel)
+        self._wheel_scale = None
+        self._sync_color_wheel()
+        self.log_message("🎨 Color wheel opened - picks apply live")
+    
+    def _wheel_color(self):
+        """Current color as the wheel shows it (normalized when HDR) and the HDR scale"""
+        r = self.color_vars['red'].get()
+        g = self.color_vars['green'].get()
+        b = self.color_vars['blue'].get()
+        max_val = max(r, g, b)
+        scale = max_val if self.auto_normalize and max_val > 1 else 1.0
+        return (r / scale, g / scale, b / scale), scale
+    
+    def _sync_color_wheel(self):
+        """Move the wheel to the current color unless the wheel itself picked it"""
+        if self.color_wheel is None:
+            return
+        (r, g, b), scale = self._wheel_color()
+        if self._wheel_scale is not None:
+            picked = [c * self._wheel_scale for c in self.color_wheel.get_rgb()]
+            if all(abs(c - p) < 1e-3 for c, p in zip((r * scale, g * scale, b * scale), picked)):
+                return
+        self._wheel_scale = scale
+        self.color_wheel.set_rgb(r, g, b)
+    
+    def _on_wheel_pick(self, r, g, b):
+        """Apply a wheel pick, keeping the HDR scale the color had when the wheel synced"""
+        if self.material is None:
+            return
+        scale = self._wheel_scale or 1.0
+        self._edit_label, self._edit_key = "Color wheel", 'wheel'
+        self.color_vars['red'].set(r * scale)
+        self.color_vars['green'].set(g * scale)
+        self.color_vars['blue'].set(b * scale)
+    
     def pick_hdr_color(self):
         """Advanced HDR color picker with intensity multiplier"""
         # Create HDR color picker dialog
@@ -858,8 +1567,19 @@ class ModernXBMEditor:
                 font=('Segoe UI', 10, 'bold'), fg='white', bg='#3a3a3a').pack()
         
         base_color_var = tk.StringVar(value=color_hex)
+        
+        def on_base_wheel_pick(r_base, g_base, b_base):
+            base_color_var.set(f"#{int(r_base * 255 + 0.5):02x}{int(g_base * 255 + 0.5):02x}{int(b_base * 255 + 0.5):02x}")
+            update_preview()
+        
+        if ColorWheel:
+            # Inline wheel: the base color and preview follow the pointer
+            hdr_dialog.geometry("500x540")
+            base_wheel = ColorWheel(base_frame, size=120, command=on_base_wheel_pick)
+            base_wheel.set_rgb(display_r, display_g, display_b)
+            base_wheel.pack(pady=5)
+        
         base_color_canvas = tk.Canvas(base_frame, width=100, height=50, bg=color_hex)
-        base_color_canvas.pack(pady=5)
         
         def pick_base_color():
             initial = (int(display_r * 255), int(display_g * 255), int(display_b * 255))
@@ -871,8 +1591,10 @@ class ModernXBMEditor:
                 base_color_canvas.config(bg=new_hex)
                 update_preview()
         
-        tk.Button(base_frame, text="Pick Base Color", command=pick_base_color,
-                 bg='#2a7fff', fg='white', font=('Segoe UI', 9, 'bold')).pack(pady=5)
+        if not ColorWheel:
+            base_color_canvas.pack(pady=5)
+            tk.Button(base_frame, text="Pick Base Color", command=pick_base_color,
+                     bg='#2a7fff', fg='white', font=('Segoe UI', 9, 'bold')).pack(pady=5)
         
         # Intensity multiplier
         intensity_frame = tk.Frame(main_frame, bg='#3a3a3a')
@@ -903,6 +1625,13 @@ class ModernXBMEditor:
         preview_canvas = tk.Canvas(preview_frame, width=150, height=75, bg=color_hex)
         preview_canvas.pack(pady=5)
         
+        # Tone-mapped sphere showing the glow the intensity actually produces
+        sphere_renderer = PreviewRenderer(75, 75) if PreviewRenderer else None
+        if sphere_renderer:
+            sphere_renderer.mode = self.preview_renderer.mode
+            hdr_dialog.sphere_photo = tk.PhotoImage(width=75, height=75)
+            preview_canvas.create_image(75, 0, anchor=tk.NW, image=hdr_dialog.sphere_photo)
+        
         preview_label = tk.Label(preview_frame, text="RGB: 0.000, 0.000, 0.000", 
                                 font=('Consolas', 9), fg='#dddddd', bg='#3a3a3a')
         preview_label.pack()
@@ -934,9 +1663,15 @@ class ModernXBMEditor:
                 b_norm = b_hdr / max_hdr if max_hdr > 0 else 0
                 
                 preview_hex = f"#{int(r_norm*255):02x}{int(g_norm*255):02x}{int(b_norm*255):02x}"
-                preview_canvas.config(bg=preview_hex)
+                if preview_canvas.cget('bg') != preview_hex:
+                    preview_canvas.config(bg=preview_hex)
                 preview_label.config(text=f"HDR RGB: {r_hdr:.3f}, {g_hdr:.3f}, {b_hdr:.3f}")
                 
+                if sphere_renderer:
+                    ppm = sphere_renderer.render_ppm((r_hdr, g_hdr, b_hdr))
+                    if ppm is not None:
+                        hdr_dialog.sphere_photo.configure(data=ppm, format='PPM')
+                
                 # Store values for application
                 hdr_dialog.hdr_values = (r_hdr, g_hdr, b_hdr)
                 
@@ -953,6 +1688,7 @@ class ModernXBMEditor:
         def apply_hdr_color():
             if hasattr(hdr_dialog, 'hdr_values'):
                 r_hdr, g_hdr, b_hdr = hdr_dialog.hdr_values
+                self._edit_label = "HDR color"
                 self.color_vars['red'].set(r_hdr)
                 self.color_vars['green'].set(g_hdr)
                 self.color_vars['blue'].set(b_hdr)
@@ -973,9 +1709,230 @@ class ModernXBMEditor:
                  bg='#6c757d', fg='white', font=('Segoe UI', 10),
                  padx=20, pady=8).pack(side=tk.LEFT)
     
+    def open_library_browser(self):
+        """Browse and filter a directory of materials by their IlluminationColor1"""
+        library_dialog = tk.Toplevel(self.root)
+        library_dialog.title("Material Library")
+        library_dialog.geometry("760x600")
+        library_dialog.configure(bg='#2c2c2c')
+        library_dialog.transient(self.root)
+        library_dialog.geometry("+{}+{}".format(
+            self.root.winfo_rootx() + 840,
+            self.root.winfo_rooty() + 170
+        ))
+        
+        main_frame = tk.Frame(library_dialog, bg='#3a3a3a', relief='solid', bd=1)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        tk.Label(main_frame, text="📚 Material Library", 
+                font=('Segoe UI', 14, 'bold'), fg='white', bg='#3a3a3a').pack(anchor=tk.W, padx=15, pady=(10, 10))
+        
+        # Directory row
+        dir_frame = tk.Frame(main_frame, bg='#3a3a3a')
+        dir_frame.pack(fill=tk.X, padx=15, pady=(0, 10))
+        
+        dir_var = tk.StringVar(value=getattr(self, 'library_dir', ''))
+        tk.Label(dir_frame, text="Folder:", 
+                font=('Segoe UI', 10), fg='#dddddd', bg='#3a3a3a').pack(side=tk.LEFT)
+        tk.Entry(dir_frame, textvariable=dir_var, font=('Segoe UI', 10), bg='#2c2c2c', fg='white',
+                insertbackground='white', relief='solid', bd=1).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=10)
+        
+        # Filter row
+        filter_frame = tk.Frame(main_frame, bg='#3a3a3a')
+        filter_frame.pack(fill=tk.X, padx=15, pady=(0, 10))
+        
+        filter_vars = {
+            'min_scale': tk.StringVar(value=""),
+            'hue_min': tk.StringVar(value=""),
+            'hue_max': tk.StringVar(value=""),
+            'min_alpha': tk.StringVar(value=""),
+            'text': tk.StringVar(value=""),
+        }
+        for label, key, width in (("HDR scale >", 'min_scale', 6), ("Hue from", 'hue_min', 5),
+                                  ("to", 'hue_max', 5), ("Alpha >", 'min_alpha', 6), ("Name", 'text', 16)):
+            tk.Label(filter_frame, text=label, 
+                    font=('Segoe UI', 9), fg='#dddddd', bg='#3a3a3a').pack(side=tk.LEFT, padx=(0, 4))
+            tk.Entry(filter_frame, textvariable=filter_vars[key], width=width, font=('Consolas', 9),
+                    bg='#2c2c2c', fg='white', insertbackground='white', relief='flat').pack(side=tk.LEFT, padx=(0, 10))
+        
+        # Results
+        results_frame = tk.Frame(main_frame, bg='#3a3a3a')
+        results_frame.pack(fill=tk.BOTH, expand=True, padx=15, pady=(0, 10))
+        
+        columns = ('file', 'rgba', 'scale', 'hue')
+        tree = ttk.Treeview(results_frame, columns=columns, show='headings', height=16)
+        tree.heading('file', text="File")
+        tree.heading('rgba', text="Raw RGBA")
+        tree.heading('scale', text="HDR")
+        tree.heading('hue', text="Hue")
+        tree.column('file', width=330)
+        tree.column('rgba', width=220)
+        tree.column('scale', width=60, anchor=tk.E)
+        tree.column('hue', width=60, anchor=tk.E)
+        scrollbar = tk.Scrollbar(results_frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        status_label = tk.Label(main_frame, text="Choose a folder and press Index", 
+                               font=('Segoe UI', 9), fg='#bbbbbb', bg='#3a3a3a')
+        status_label.pack(anchor=tk.W, padx=15)
+        
+        max_rows = 1000
+        
+        def parse_float(key):
+            try:
+                return float(filter_vars[key].get())
+            except ValueError:
+                return None
+        
+        def refresh_results(*args):
+            matches = self.library_index.query(
+                min_scale=parse_float('min_scale'),
+                hue_min=parse_float('hue_min'),
+                hue_max=parse_float('hue_max'),
+                min_alpha=parse_float('min_alpha'),
+                text=filter_vars['text'].get().strip() or None,
+                limit=max_rows
+            )
+            tree.delete(*tree.get_children())
+            for entry in matches:
+                rgba_text = ", ".join(f"{v:.3f}" for v in entry.rgba)
+                tree.insert('', tk.END, iid=entry.path, values=(
+                    os.path.relpath(entry.path, dir_var.get() or '.'), rgba_text,
+                    f"{entry.hdr_scale:.2f}x", f"{entry.hue:.0f}°"))
+            shown = f"{len(matches)}+" if len(matches) >= max_rows else str(len(matches))
+            indexer = self.library_indexer
+            if indexer and indexer.is_alive():
+                state = f"Indexing... {indexer.scanned:,} scanned"
+            else:
+                state = "Index ready"
+            status_label.config(text=f"{state} | {len(self.library_index):,} materials | {shown} shown")
+        
+        for var in filter_vars.values():
+            var.trace('w', refresh_results)
+        
+        def poll_indexer():
+            if not library_dialog.winfo_exists():
+                return
+            refresh_results()
+            if self.library_indexer and self.library_indexer.is_alive():
+                library_dialog.after(500, poll_indexer)
+            elif self.library_indexer:
+                self.log_message(f"📚 Library indexed: {self.library_indexer.indexed:,} materials "
+                                 f"({self.library_indexer.errors} errors)")
+        
+        def browse_dir():
+            directory = filedialog.askdirectory(title="Choose Material Folder", parent=library_dialog)
+            if directory:
+                dir_var.set(directory)
+                start_index()
+        
+        def start_index():
+            directory = dir_var.get()
+            if not directory or not os.path.isdir(directory):
+                status_label.config(text="Folder not found")
+                return
+            if self.library_indexer and self.library_indexer.is_alive():
+                self.library_indexer.stop()
+                self.library_indexer.join()
+            self.library_dir = directory
+            self.library_index.clear()
+            self.library_indexer = LibraryIndexer(directory, self.library_index)
+            self.library_indexer.start()
+            self.log_message(f"📚 Indexing material library: {directory}")
+            poll_indexer()
+        
+        def open_selected(event=None):
+            selection = tree.selection()
+            if selection:
+                self.open_file(selection[0])
+        
+        tree.bind('<Double-1>', open_selected)
+        
+        tk.Button(dir_frame, text="Browse...", command=browse_dir,
+                 bg='#2a7fff', fg='white', font=('Segoe UI', 9, 'bold'),
+                 relief='flat', padx=10).pack(side=tk.LEFT, padx=(0, 5))
+        tk.Button(dir_frame, text="Index", command=start_index,
+                 bg='#107c10', fg='white', font=('Segoe UI', 9, 'bold'),
+                 relief='flat', padx=10).pack(side=tk.LEFT)
+        
+        refresh_results()
+        if self.library_indexer and self.library_indexer.is_alive():
+            poll_indexer()
+    
+    def _record_color_edit(self, previous_colors):
+        """Add the change from previous_colors to the current document's undo history"""
+        label, self._edit_label = self._edit_label, None
+        key, self._edit_key = self._edit_key, None
+        document = self.session.current
+        if document is None or self.illumination_color_position is None:
+            return
+        
+        keys = ('red', 'green', 'blue', 'alpha')
+        old = tuple(previous_colors[key] for key in keys)
+        new = tuple(self.current_colors[key] for key in keys)
+        if old == new:
+            return
+        
+        # Slider drags, wheel drags and typed values within a short pause merge into one step
+        document.history.record([(self.illumination_color_position, old, new)],
+                                label or "Adjust color", key=key if label else 'adjust')
+        self._update_history_buttons()
+    
+    def _update_history_buttons(self):
+        """Enable Undo/Redo to match the current document's history"""
+        document = self.session.current
+        history = document.history if document is not None else None
+        self.undo_btn.config(state='normal' if history and history.can_undo else 'disabled')
+        self.redo_btn.config(state='normal' if history and history.can_redo else 'disabled')
+    
+    def _apply_history_colors(self, rgba):
+        """Show restored colors without recording them as a new edit"""
+        self._updating_sliders = True
+        try:
+            for key, value in zip(('red', 'green', 'blue', 'alpha'), rgba):
+                self.color_vars[key].set(value)
+        finally:
+            delattr(self, '_updating_sliders')
+        self.current_colors = rgba_to_dict(rgba)
+        self.on_color_change()
+    
+    def _on_history_key(self, event, action):
+        """Undo/redo shortcuts, except while typing in an entry field"""
+        if not isinstance(event.widget, tk.Entry):
+            action()
+    
+    def undo(self):
+        """Step back through the current document's color edits"""
+        document = self.session.current
+        if document is None:
+            return
+        entry = document.history.undo()
+        if entry is not None:
+            for position, old, new in entry.deltas():
+                if position == self.illumination_color_position:
+                    self._apply_history_colors(old)
+            self.log_message(f"↶ Undo: {entry.label}")
+        self._update_history_buttons()
+    
+    def redo(self):
+        """Re-apply the last undone color edit"""
+        document = self.session.current
+        if document is None:
+            return
+        entry = document.history.redo()
+        if entry is not None:
+            for position, old, new in entry.deltas():
+                if position == self.illumination_color_position:
+                    self._apply_history_colors(new)
+            self.log_message(f"↷ Redo: {entry.label}")
+        self._update_history_buttons()
+    
     def reset_to_original(self):
         """Reset to original values"""
         if self.original_colors:
+            self._edit_label = "Reset to original"
             self.color_vars['red'].set(self.original_colors['red'])
             self.color_vars['green'].set(self.original_colors['green'])
             self.color_vars['blue'].set(self.original_colors['blue'])
@@ -991,6 +1948,7 @@ class ModernXBMEditor:
         max_val = max(r, g, b)
         
         if max_val > 1:
+            self._edit_label = "Manual normalize"
             self.color_vars['red'].set(r / max_val)
             self.color_vars['green'].set(g / max_val)
             self.color_vars['blue'].set(b / max_val)
@@ -1044,25 +2002,19 @@ class ModernXBMEditor:
             return
         
         try:
-            pos = self.illumination_color_position
-            
             # Get current raw values (not display values)
             r = self.color_vars['red'].get()
             g = self.color_vars['green'].get()
             b = self.color_vars['blue'].get()
             a = self.color_vars['alpha'].get()
             
-            # Pack new values
-            red_bytes = struct.pack('<f', r)
-            green_bytes = struct.pack('<f', g)
-            blue_bytes = struct.pack('<f', b)
-            alpha_bytes = struct.pack('<f', a)
-            
             # Update file data
-            self.file_data[pos:pos+4] = red_bytes
-            self.file_data[pos+4:pos+8] = green_bytes
-            self.file_data[pos+8:pos+12] = blue_bytes
-            self.file_data[pos+12:pos+16] = alpha_bytes
+            self.material.set_color((r, g, b, a))
+            
+            archive_entry = split_entry_path(self.file_path)
+            if archive_entry:
+                self._save_archive_entry(archive_entry, (r, g, b, a))
+                return
             
             # Save file
             save_path = filedialog.asksaveasfilename(
@@ -1073,8 +2025,16 @@ class ModernXBMEditor:
             )
             
             if save_path:
-                with open(save_path, 'wb') as f:
-                    f.write(self.file_data)
+                with profiler.timer('save.write'):
+                    self.material.save(save_path)
+                if os.path.abspath(save_path) == os.path.abspath(self.file_path):
+                    self._store_scan_record(save_path)
+                    document = self.session.current
+                    if document is not None:
+                        document.rgba = (r, g, b, a)
+                        document.mark_saved()
+                        self.original_colors = rgba_to_dict((r, g, b, a))
+                        self._refresh_document_list()
                 
                 filename = os.path.basename(save_path)
                 max_rgb = max(r, g, b)
@@ -1095,20 +2055,150 @@ class ModernXBMEditor:
             messagebox.showerror("Error", f"Failed to save file: {str(e)}")
             self.log_message(f"❌ Error saving: {str(e)}")
     
+    def _save_archive_entry(self, archive_entry, rgba):
+        """Write the edited material back into its .fat/.dat archive"""
+        fat_path, name = archive_entry
+        if not messagebox.askyesno("Save to Archive",
+                                   f"Write the new color into {os.path.basename(fat_path)}?\n\n{name}"):
+            return
+        
+        archive = self._get_archive(fat_path)
+        if archive is None:
+            return
+        with profiler.timer('save.write'):
+            archive.write_material(name, self.material)
+            archive.save_index()
+        
+        document = self.session.current
+        if document is not None:
+            document.rgba = rgba
+            document.mark_saved()
+            self.original_colors = rgba_to_dict(rgba)
+            self._refresh_document_list()
+        
+        self.log_message(f"💾 Saved into archive: {os.path.basename(fat_path)} → {name}")
+        self.update_status(f"Saved into archive: {name}")
+    
     def log_message(self, message):
-        """Add message to log with timestamp"""
-        import datetime
-        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
+        """Queue a timestamped message for the log (shown on the next flush)"""
+        self.log_buffer.append(message)
+        if not self._log_flush_pending:
+            self._log_flush_pending = True
+            self.root.after(LOG_FLUSH_MS, self._flush_log)
+    
+    def _flush_log(self):
+        """Append all queued log lines at once and trim the log to its line limit"""
+        self._log_flush_pending = False
+        lines = self.log_buffer.drain()
+        if not lines:
+            return
+        
+        self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+        
+        # Drop the oldest lines beyond the retained limit
+        line_count = int(self.log_text.index('end-1c').split('.')[0]) - 1
+        excess = line_count - self.log_buffer.max_lines
+        if excess > 0:
+            self.log_text.delete('1.0', f'{excess + 1}.0')
+        
         self.log_text.see(tk.END)
-        self.root.update_idletasks()
+    
+    def open_diagnostics(self):
+        """Show live stage timings with JSON/cProfile export"""
+        if getattr(self, 'diagnostics_dialog', None) and self.diagnostics_dialog.winfo_exists():
+            self.diagnostics_dialog.lift()
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Diagnostics")
+        dialog.geometry("620x360")
+        dialog.configure(bg='#2c2c2c')
+        dialog.transient(self.root)
+        dialog.geometry("+{}+{}".format(
+            self.root.winfo_rootx() + 900,
+            self.root.winfo_rooty() + 560
+        ))
+        self.diagnostics_dialog = dialog
+        
+        main_frame = tk.Frame(dialog, bg='#3a3a3a', relief='solid', bd=1)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        tk.Label(main_frame, text="📈 Diagnostics", 
+                font=('Segoe UI', 12, 'bold'), fg='white', bg='#3a3a3a').pack(anchor=tk.W, padx=15, pady=(10, 5))
+        
+        stats_text = tk.Text(main_frame, height=12, wrap=tk.NONE,
+                            font=('Consolas', 9), bg='#2c2c2c', fg='#dddddd',
+                            relief='solid', bd=1)
+        stats_text.pack(fill=tk.BOTH, expand=True, padx=15, pady=(0, 10))
+        
+        def refresh():
+            if not dialog.winfo_exists():
+                return
+            lines = [f"{'Stage':<24}{'Count':>7}{'Last ms':>10}{'Mean ms':>10}{'Max ms':>10}{'Total ms':>11}"]
+            for stage, stats in profiler.snapshot().items():
+                lines.append(f"{stage:<24}{stats['count']:>7}{stats['last_ms']:>10.2f}"
+                             f"{stats['mean_ms']:>10.2f}{stats['max_ms']:>10.2f}{stats['total_ms']:>11.1f}")
+            session = self.session
+            lines.append("")
+            lines.append(f"Session: {len(session)} open, {session.resident_count} in memory "
+                         f"({session.resident_bytes / (1024 * 1024):.1f} MB), "
+                         f"{session.loads} loads, {session.evictions} evictions")
+            stats_text.delete('1.0', tk.END)
+            stats_text.insert('1.0', "\n".join(lines))
+            dialog.after(DIAGNOSTICS_REFRESH_MS, refresh)
+        
+        def save_json():
+            path = filedialog.asksaveasfilename(title="Save Timing Report", parent=dialog,
+                                                defaultextension=".json",
+                                                filetypes=[("JSON files", "*.json")],
+                                                initialfile="xbm_editor_profile.json")
+            if path:
+                try:
+                    profiler.dump_json(path)
+                    self.log_message(f"📈 Timing report saved: {os.path.basename(path)}")
+                except Exception as e:
+                    self.log_message(f"❌ Failed to save timing report: {str(e)}")
+        
+        def save_cprofile():
+            path = filedialog.asksaveasfilename(title="Save cProfile Stats", parent=dialog,
+                                                defaultextension=".prof",
+                                                filetypes=[("cProfile stats", "*.prof")],
+                                                initialfile="xbm_editor.prof")
+            if path:
+                try:
+                    profiler.dump_cprofile(path)
+                    self.log_message(f"📈 cProfile stats saved: {os.path.basename(path)}")
+                except Exception as e:
+                    self.log_message(f"❌ Failed to save cProfile stats: {str(e)}")
+        
+        button_frame = tk.Frame(main_frame, bg='#3a3a3a')
+        button_frame.pack(fill=tk.X, padx=15, pady=(0, 10))
+        
+        tk.Button(button_frame, text="Save JSON Report", command=save_json,
+                 bg='#2a7fff', fg='white', font=('Segoe UI', 9, 'bold'),
+                 relief='flat', padx=10).pack(side=tk.LEFT, padx=(0, 10))
+        
+        tk.Button(button_frame, text="Save cProfile", command=save_cprofile,
+                 bg='#6f42c1', fg='white', font=('Segoe UI', 9, 'bold'),
+                 relief='flat', padx=10,
+                 state='normal' if profiler.has_cprofile else 'disabled').pack(side=tk.LEFT)
+        
+        refresh()
     
     def update_status(self, message):
         """Update status text"""
         self.canvas.itemconfig(self.status_text, text=message)
-        self.root.update_idletasks()
 
 def main():
+    # "xbm_editor.py batch ..." runs the headless batch editor instead of the GUI
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from xbm_batch import main as batch_main
+        sys.exit(batch_main(sys.argv[2:]))
+    
+    # --profile turns on stage timings and cProfile (XBM_EDITOR_PROFILE=1 gives timings only)
+    if "--profile" in sys.argv[1:]:
+        profiler.enable(with_cprofile=True)
+    
     root = tk.Tk()
     
     # Set modern window properties
@@ -0,0 +1,137 @@
+"""Per-document undo/redo history stored as packed RGBA deltas.
+
+Each entry records only what changed: the color offset plus the old and new
+RGBA, packed as float32 like the file itself (40 bytes per color). Entries
+that share a coalesce key and arrive close together (a slider drag, typing
+in an entry) are merged into one step. The history is limited by the memory
+its entries use rather than by a step count; the oldest steps go first.
+"""
+import struct
+import time
+from collections import deque
+
+DELTA = struct.Struct('<Q4f4f')
+DEFAULT_MAX_BYTES = 1024 * 1024
+ENTRY_OVERHEAD = 64  # Rough per-entry cost of the object, label and list slot
+COALESCE_SECONDS = 0.8
+
+
+class HistoryEntry:
+    """One undo step: a label and one or more packed (position, old, new) deltas"""
+
+    __slots__ = ('label', 'packed', 'key', 'stamp')
+
+    def __init__(self, label, deltas, key=None):
+        self.label = label
+        self.packed = b"".join(DELTA.pack(position, *old, *new) for position, old, new in deltas)
+        self.key = key
+        self.stamp = time.monotonic()
+
+    @property
+    def nbytes(self):
+        return len(self.packed) + ENTRY_OVERHEAD
+
+    def deltas(self):
+        """List of (position, old_rgba, new_rgba)"""
+        return [(values[0], values[1:5], values[5:9]) for values in DELTA.iter_unpack(self.packed)]
+
+    def positions(self):
+        return [position for position, _, _ in self.deltas()]
+
+
+class EditHistory:
+    """Undo/redo stacks of HistoryEntry objects capped at max_bytes"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, coalesce_seconds=COALESCE_SECONDS):
+        self.max_bytes = max_bytes
+        self.coalesce_seconds = coalesce_seconds
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.nbytes = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.undo_stack)
+
+    @property
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    @property
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def record(self, deltas, label, key=None):
+        """Add a step (or extend the last one when key matches); returns the entry or None"""
+        deltas = [(position, tuple(old), tuple(new)) for position, old, new in deltas]
+        if not deltas:
+            return None
+        self._clear_redo()
+
+        last = self.undo_stack[-1] if self.undo_stack else None
+        if (key is not None and last is not None and last.key == key
+                and time.monotonic() - last.stamp <= self.coalesce_seconds
+                and last.positions() == [position for position, _, _ in deltas]):
+            # Keep the first old value of the drag, take the latest new value
+            merged = [(position, old, new) for (position, old, _), (_, _, new)
+                      in zip(last.deltas(), deltas)]
+            self._pop_undo()
+            if all(self._same(old, new) for _, old, new in merged):
+                return None  # Dragged back to where it started
+            deltas = merged
+
+        entry = HistoryEntry(label, deltas, key)
+        self.undo_stack.append(entry)
+        self.nbytes += entry.nbytes
+        self._trim()
+        return entry
+
+    def undo(self):
+        """Pop the last step; apply its old values. Returns the entry or None"""
+        if not self.undo_stack:
+            return None
+        entry = self._pop_undo()
+        entry.key = None  # An undone step never merges with later edits
+        self.redo_stack.append(entry)
+        self.nbytes += entry.nbytes
+        return entry
+
+    def redo(self):
+        """Re-apply the last undone step's new values. Returns the entry or None"""
+        if not self.redo_stack:
+            return None
+        entry = self.redo_stack.pop()
+        self.nbytes -= entry.nbytes
+        self.undo_stack.append(entry)
+        self.nbytes += entry.nbytes
+        return entry
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.nbytes = 0
+
+    def break_coalescing(self):
+        """Make the next edit start a new step"""
+        if self.undo_stack:
+            self.undo_stack[-1].key = None
+
+    def _pop_undo(self):
+        entry = self.undo_stack.pop()
+        self.nbytes -= entry.nbytes
+        return entry
+
+    def _clear_redo(self):
+        for entry in self.redo_stack:
+            self.nbytes -= entry.nbytes
+        self.redo_stack.clear()
+
+    def _trim(self):
+        while self.nbytes > self.max_bytes and len(self.undo_stack) > 1:
+            entry = self.undo_stack.popleft()
+            self.nbytes -= entry.nbytes
+            self.dropped += 1
+
+    @staticmethod
+    def _same(a, b):
+        return struct.pack('<4f', *a) == struct.pack('<4f', *b)
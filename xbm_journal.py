@@ -0,0 +1,139 @@
+"""Write-ahead journal for batch color patches, with rollback.
+
+Before a batch writes anything, every change is appended to a JSON Lines
+journal as (path, offset, old bytes, new bytes) and synced to disk. Rolling
+back walks the journal in reverse and puts the old bytes back wherever the
+file still holds the new ones, so a whole batch can be undone even if it
+was interrupted part-way through.
+"""
+import datetime
+import json
+import os
+from collections import OrderedDict, namedtuple
+
+from xbm_core import pack_rgba
+
+JOURNAL_VERSION = 1
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.expanduser("~"), ".xbm_color_editor", "journals")
+
+# status is 'restored', 'unchanged' (old bytes already there, e.g. the write
+# never happened), 'conflict' (the file holds neither) or 'error'
+RollbackResult = namedtuple('RollbackResult', 'path offset status error')
+
+
+class JournalError(ValueError):
+    """Raised for unreadable or foreign journal files"""
+
+
+def default_journal_path():
+    """A new timestamped journal path in DEFAULT_JOURNAL_DIR"""
+    stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    return os.path.join(DEFAULT_JOURNAL_DIR, f"batch_{stamp}.jsonl")
+
+
+class Journal:
+    """Append-only record of (path, offset, old, new) byte patches"""
+
+    def __init__(self, path, description=None):
+        self.path = path
+        self.entries = 0
+        journal_dir = os.path.dirname(path)
+        if journal_dir:
+            os.makedirs(journal_dir, exist_ok=True)
+        self.file = open(path, 'x', encoding='utf-8')
+        self._write({'journal': JOURNAL_VERSION,
+                     'created': datetime.datetime.now().isoformat(timespec='seconds'),
+                     'description': description})
+
+    def _write(self, obj):
+        self.file.write(json.dumps(obj) + "\n")
+
+    def record(self, path, offset, old, new):
+        """Journal one patch of old -> new bytes at offset"""
+        self._write({'path': os.path.abspath(path), 'offset': offset,
+                     'old': old.hex(), 'new': new.hex()})
+        self.entries += 1
+
+    def record_colors(self, path, changes):
+        """Journal (name, position, old_rgba, new_rgba) color changes of one file"""
+        for name, pos, old_rgba, new_rgba in changes:
+            self.record(path, pos, pack_rgba(old_rgba), pack_rgba(new_rgba))
+
+    def commit(self):
+        """Make everything recorded so far durable before the files are touched"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if not self.file.closed:
+            self.commit()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def read_journal(path):
+    """Return (header, entries); entries are dicts with old/new as bytes"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = [line for line in f if line.strip()]
+        header = json.loads(lines[0]) if lines else {}
+    except (OSError, ValueError) as e:
+        raise JournalError(f"Cannot read journal {path}: {e}")
+    if not isinstance(header, dict) or header.get('journal') != JOURNAL_VERSION:
+        raise JournalError(f"{path} is not an XBM batch journal")
+
+    entries = []
+    for line in lines[1:]:
+        try:
+            entry = json.loads(line)
+            entry['old'] = bytes.fromhex(entry['old'])
+            entry['new'] = bytes.fromhex(entry['new'])
+        except (ValueError, KeyError, TypeError):
+            break  # Torn last line from an interrupted batch
+        entries.append(entry)
+    return header, entries
+
+
+def rollback(journal_path, dry_run=False):
+    """Undo a journaled batch, newest change first, yielding a RollbackResult per entry
+
+    A patch is only reverted where the file still holds its new bytes, so
+    files edited since the batch are reported as conflicts and left alone.
+    """
+    header, entries = read_journal(journal_path)
+
+    by_path = OrderedDict()
+    for entry in reversed(entries):
+        by_path.setdefault(entry['path'], []).append(entry)
+
+    for path, file_entries in by_path.items():
+        try:
+            results = []
+            with open(path, 'rb' if dry_run else 'r+b') as f:
+                for entry in file_entries:
+                    offset, old, new = entry['offset'], entry['old'], entry['new']
+                    f.seek(offset)
+                    current = f.read(len(new))
+                    if current == new:
+                        if not dry_run:
+                            f.seek(offset)
+                            f.write(old)
+                        results.append(RollbackResult(path, offset, 'restored', None))
+                    elif current == old:
+                        results.append(RollbackResult(path, offset, 'unchanged', None))
+                    else:
+                        results.append(RollbackResult(path, offset, 'conflict',
+                                                      "file changed since the batch"))
+                if not dry_run:
+                    f.flush()
+                    os.fsync(f.fileno())
+            yield from results
+        except OSError as e:
+            for entry in file_entries:
+                yield RollbackResult(path, entry['offset'], 'error', str(e))
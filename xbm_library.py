@@ -0,0 +1,131 @@
+"""In-memory color index over a directory of XBM materials.
+
+LibraryIndexer fills a ColorIndex from a background thread (reusing the
+persistent scan cache), and ColorIndex.query filters it by HDR scale, hue
+and alpha without touching the disk.
+"""
+import threading
+from collections import namedtuple
+
+from xbm_cache import DEFAULT_CACHE_PATH, ScanCache, scan_file
+from xbm_core import describe_color, iter_xbm_files
+
+LibraryEntry = namedtuple('LibraryEntry', 'path rgba hdr_scale hue saturation alpha')
+
+
+def make_entry(path, rgba):
+    """Build a LibraryEntry with the derived values the browser filters on"""
+    hdr_scale, hue, saturation = describe_color(rgba)
+    return LibraryEntry(path, tuple(rgba), hdr_scale, hue, saturation, rgba[3])
+
+
+class ColorIndex:
+    """Thread-safe, append-only list of LibraryEntry with in-memory filtering"""
+
+    def __init__(self):
+        self._entries = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, entry):
+        with self._lock:
+            self._entries.append(entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+
+    def query(self, min_scale=None, max_scale=None, hue_min=None, hue_max=None,
+              min_alpha=None, max_alpha=None, text=None, limit=None):
+        """Return entries matching every given filter
+
+        Hue is in degrees; a missing hue bound counts as 0 or 360, and a
+        range with hue_min > hue_max wraps around red (e.g. 330..30).
+        """
+        with self._lock:
+            entries = self._entries
+
+        text = text.lower() if text else None
+        if hue_min is not None or hue_max is not None:
+            hue_min = 0.0 if hue_min is None else hue_min
+            hue_max = 360.0 if hue_max is None else hue_max
+        results = []
+        for entry in entries:
+            if min_scale is not None and entry.hdr_scale < min_scale:
+                continue
+            if max_scale is not None and entry.hdr_scale > max_scale:
+                continue
+            if min_alpha is not None and entry.alpha < min_alpha:
+                continue
+            if max_alpha is not None and entry.alpha > max_alpha:
+                continue
+            if hue_min is not None:
+                if hue_min <= hue_max:
+                    if not hue_min <= entry.hue <= hue_max:
+                        continue
+                elif hue_max < entry.hue < hue_min:
+                    continue
+            if text and text not in entry.path.lower():
+                continue
+            results.append(entry)
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+
+class LibraryIndexer(threading.Thread):
+    """Background thread that walks a directory and fills a ColorIndex
+
+    Progress can be read from scanned/indexed/errors while it runs; call
+    stop() to cancel. The thread opens its own scan cache connection.
+    """
+
+    def __init__(self, root_dir, index, pattern="*.xbm", cache_path=DEFAULT_CACHE_PATH):
+        super().__init__(daemon=True)
+        self.root_dir = root_dir
+        self.index = index
+        self.pattern = pattern
+        self.cache_path = cache_path
+        self.scanned = 0
+        self.indexed = 0
+        self.errors = 0
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    @property
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def run(self):
+        cache = None
+        if self.cache_path:
+            try:
+                cache = ScanCache(self.cache_path)
+            except Exception:
+                cache = None
+
+        try:
+            for path in iter_xbm_files(self.root_dir, self.pattern):
+                if self.stopped:
+                    break
+                self.scanned += 1
+                try:
+                    if cache is not None:
+                        record = cache.scan(path)
+                    else:
+                        record = scan_file(path)
+                except Exception:
+                    self.errors += 1
+                    continue
+                if record.rgba is not None:
+                    self.index.add(make_entry(path, record.rgba))
+                    self.indexed += 1
+                if cache is not None and self.scanned % 500 == 0:
+                    cache.commit()
+        finally:
+            if cache is not None:
+                cache.close()
@@ -0,0 +1,53 @@
+"""Buffered, size-limited operation log.
+
+LogBuffer timestamps messages, keeps only the most recent lines in memory
+and queues new lines until the UI drains them in one batch. Lines can also
+be mirrored to a rotating log file.
+"""
+import datetime
+import logging
+import logging.handlers
+from collections import deque
+
+DEFAULT_MAX_LINES = 2000
+
+
+class LogBuffer:
+    """Ring-limited log with a pending queue for batched display"""
+
+    def __init__(self, max_lines=DEFAULT_MAX_LINES, log_file=None, max_bytes=1024 * 1024, backup_count=3):
+        self.max_lines = max_lines
+        self.lines = deque(maxlen=max_lines)
+        self.pending = deque(maxlen=max_lines)
+        self.logger = None
+
+        if log_file:
+            handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes,
+                                                           backupCount=backup_count, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self.logger = logging.getLogger(f"xbm_editor.log.{id(self)}")
+            self.logger.propagate = False
+            self.logger.setLevel(logging.INFO)
+            self.logger.addHandler(handler)
+
+    def append(self, message):
+        """Timestamp and queue a message, returning the formatted line"""
+        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+        line = f"[{timestamp}] {message}"
+        self.lines.append(line)
+        self.pending.append(line)
+        if self.logger is not None:
+            self.logger.info(message)
+        return line
+
+    def drain(self):
+        """Return and clear the lines queued since the last drain"""
+        lines = list(self.pending)
+        self.pending.clear()
+        return lines
+
+    def close(self):
+        if self.logger is not None:
+            for handler in list(self.logger.handlers):
+                handler.close()
+                self.logger.removeHandler(handler)
@@ -0,0 +1,152 @@
+"""Tone-mapped HDR material preview (requires NumPy).
+
+Renders a lit sphere whose surface carries the raw IlluminationColor1 as an
+emissive term, so a 3.5x glow looks brighter than a 1.0x one instead of
+being clamped or divided back to 0-1. The HDR image is tone-mapped
+(ACES-style, Reinhard or a plain clamp), optionally bloomed, gamma-encoded
+and returned as binary PPM data for a single Tk PhotoImage.
+
+Geometry (normals, lighting and masks) and the bloom kernel depend only on
+the image size and are computed once per size, so a re-render on slider
+drag is a handful of whole-array operations.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+TONE_MAPPERS = ('ACES', 'Reinhard', 'Clamp')
+BACKGROUND = np.array([0.025, 0.025, 0.025], dtype=np.float32)  # Linear #2c2c2c-ish
+ALBEDO = np.array([0.18, 0.18, 0.18], dtype=np.float32)
+LIGHT_DIRECTION = (-0.45, -0.55, 0.70)
+BLOOM_DOWNSAMPLE = 4
+BLOOM_THRESHOLD = 1.0
+# Emission is clamped to this so inf/NaN or absurd colors keep the math finite;
+# every tone mapper is saturated long before it
+MAX_EMISSION = 1.0e4
+
+
+def tone_map(hdr, mode='ACES', exposure=1.0):
+    """Map linear HDR values to 0-1"""
+    x = hdr * exposure
+    if mode == 'ACES':
+        # Narkowicz's fit of the ACES filmic curve
+        return np.clip((x * (2.51 * x + 0.03)) / (x * (2.43 * x + 0.59) + 0.14), 0.0, 1.0)
+    if mode == 'Reinhard':
+        return x / (1.0 + x)
+    return np.clip(x, 0.0, 1.0)
+
+
+@lru_cache(maxsize=8)
+def sphere_geometry(width, height):
+    """(base, emission) buffers of a lit sphere centred in the image
+
+    base is the HDR image of the unlit-by-emission sphere over the
+    background; emission is the per-pixel weight of the emissive color.
+    """
+    radius = min(width, height) * 0.42
+    ys, xs = np.mgrid[0:height, 0:width].astype(np.float32)
+    nx = (xs + 0.5 - width / 2.0) / radius
+    ny = (ys + 0.5 - height / 2.0) / radius
+    rr = nx * nx + ny * ny
+    mask = rr <= 1.0
+    nz = np.sqrt(np.clip(1.0 - rr, 0.0, 1.0))
+
+    light = np.asarray(LIGHT_DIRECTION, dtype=np.float32)
+    light /= np.linalg.norm(light)
+    n_dot_l = np.clip(nx * light[0] + ny * light[1] + nz * light[2], 0.0, 1.0)
+    # Blinn-Phong highlight with the viewer looking down -z
+    half = light + np.array([0.0, 0.0, 1.0], dtype=np.float32)
+    half /= np.linalg.norm(half)
+    n_dot_h = np.clip(nx * half[0] + ny * half[1] + nz * half[2], 0.0, 1.0)
+
+    # Soft anti-aliased edge
+    edge = np.clip((1.0 - np.sqrt(rr)) * radius, 0.0, 1.0)
+    coverage = (edge * mask)[..., None]
+    diffuse = (0.08 + 0.92 * n_dot_l)[..., None]
+    facing = (0.55 + 0.45 * nz)[..., None]  # Emission reads stronger face-on
+    specular = (0.35 * n_dot_h ** 48)[..., None]
+
+    base = BACKGROUND + coverage * (ALBEDO * diffuse + specular - BACKGROUND)
+    emission = coverage * facing
+    return base.astype(np.float32), emission.astype(np.float32)
+
+
+# 0-1 -> gamma-encoded 8-bit lookup, cheaper than a per-pixel power
+GAMMA_LUT_SIZE = 4096
+GAMMA_LUT = (np.power(np.linspace(0.0, 1.0, GAMMA_LUT_SIZE), 1.0 / 2.2) * 255.0 + 0.5).astype(np.uint8)
+
+
+@lru_cache(maxsize=8)
+def bloom_kernel(radius=3):
+    x = np.arange(-radius, radius + 1, dtype=np.float32)
+    kernel = np.exp(-(x * x) / (2.0 * (radius / 2.0) ** 2))
+    return kernel / kernel.sum()
+
+
+def _blur(image, kernel):
+    """Separable blur of an (H, W, 3) array using shifted sums"""
+    radius = len(kernel) // 2
+    for axis in (0, 1):
+        padded = np.pad(image, [(radius, radius) if a == axis else (0, 0) for a in range(3)], mode='edge')
+        out = np.zeros_like(image)
+        size = image.shape[axis]
+        for i, weight in enumerate(kernel):
+            out += weight * (padded[i:i + size] if axis == 0 else padded[:, i:i + size])
+        image = out
+    return image
+
+
+def bloom(hdr, strength=0.6):
+    """Add a blurred copy of everything above BLOOM_THRESHOLD, computed at reduced size"""
+    h, w = hdr.shape[:2]
+    f = BLOOM_DOWNSAMPLE
+    hs, ws = h // f, w // f
+    bright = np.maximum(hdr[:hs * f, :ws * f] - BLOOM_THRESHOLD, 0.0)
+    small = bright.reshape(hs, f, ws, f, 3).mean(axis=(1, 3))
+    small = _blur(_blur(small, bloom_kernel()), bloom_kernel())
+    glow = np.repeat(np.repeat(small, f, axis=0), f, axis=1)
+    out = hdr.copy()
+    out[:hs * f, :ws * f] += strength * glow
+    return out
+
+
+def render(rgb, width=220, height=220, mode='ACES', use_bloom=True, exposure=1.0):
+    """Render the preview as an (H, W, 3) uint8 array for raw emissive rgb"""
+    base, emission = sphere_geometry(width, height)
+    emissive = np.nan_to_num(np.asarray(rgb, dtype=np.float32), nan=0.0, posinf=MAX_EMISSION, neginf=0.0)
+    emissive = np.clip(emissive, 0.0, MAX_EMISSION)
+
+    hdr = base + emission * emissive
+    if use_bloom:
+        hdr = bloom(hdr)
+
+    ldr = tone_map(hdr, mode, exposure)
+    return GAMMA_LUT[(ldr * (GAMMA_LUT_SIZE - 1)).astype(np.intp)]
+
+
+def to_ppm(pixels):
+    """Binary PPM data for an (H, W, 3) uint8 array (accepted by tk.PhotoImage)"""
+    h, w = pixels.shape[:2]
+    return b"P6 %d %d 255\n" % (w, h) + pixels.tobytes()
+
+
+class PreviewRenderer:
+    """Remembers the last rendered inputs so unchanged previews are not redrawn"""
+
+    def __init__(self, width=220, height=220):
+        self.width = width
+        self.height = height
+        self.mode = 'ACES'
+        self.use_bloom = True
+        self._last_key = None
+
+    def render_ppm(self, rgb):
+        """PPM data for rgb, or None when nothing changed since the last call"""
+        key = (tuple(rgb), self.mode, self.use_bloom)
+        if key == self._last_key:
+            return None
+        self._last_key = key
+        return to_ppm(render(rgb, self.width, self.height, self.mode, self.use_bloom))
+
+    def invalidate(self):
+        self._last_key = None
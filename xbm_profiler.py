@@ -0,0 +1,138 @@
+"""Opt-in timing instrumentation for the editor's startup and hot paths.
+
+Enable with the XBM_EDITOR_PROFILE=1 environment variable or the editor's
+--profile flag. When disabled, profiler.timer() returns a shared no-op
+context manager so instrumented code pays almost nothing.
+"""
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class StageStats:
+    """Running count/total/min/max/last of one instrumented stage (seconds)"""
+
+    __slots__ = ('count', 'total', 'min', 'max', 'last')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': self.total * 1000,
+            'mean_ms': self.mean * 1000,
+            'min_ms': self.min * 1000 if self.count else 0.0,
+            'max_ms': self.max * 1000,
+            'last_ms': self.last * 1000,
+        }
+
+
+class Profiler:
+    """Collects per-stage timings and optionally runs cProfile"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stages = {}
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._cprofile = None
+
+    def enable(self, with_cprofile=False):
+        self.enabled = True
+        if with_cprofile and self._cprofile is None:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def record(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats()
+            stats.add(seconds)
+
+    def timer(self, stage):
+        """Context manager timing a block under stage"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return self._timed(stage)
+
+    @contextmanager
+    def _timed(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def snapshot(self):
+        """Stage name -> stats dict, sorted by name"""
+        with self._lock:
+            return {name: self.stages[name].to_dict() for name in sorted(self.stages)}
+
+    def report(self):
+        """Full JSON-serialisable report"""
+        return {
+            'uptime_s': time.perf_counter() - self.started,
+            'stages': self.snapshot(),
+        }
+
+    def dump_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+
+    @property
+    def has_cprofile(self):
+        return self._cprofile is not None
+
+    def dump_cprofile(self, path):
+        """Write cProfile stats (loadable with pstats/snakeviz) to path"""
+        if self._cprofile is None:
+            raise RuntimeError("cProfile is not running (start the editor with --profile)")
+        self._cprofile.disable()
+        try:
+            pstats.Stats(self._cprofile).dump_stats(path)
+        finally:
+            self._cprofile.enable()
+
+
+def env_flag(name):
+    """True when environment variable name is set to anything but '', 0, false or no"""
+    return os.environ.get(name, '').strip().lower() not in ('', '0', 'false', 'no')
+
+
+profiler = Profiler(enabled=env_flag('XBM_EDITOR_PROFILE'))
@@ -0,0 +1,194 @@
+"""Declarative recolor rules loaded from JSON or TOML files.
+
+A rules file is a list of rules. Each rule selects materials by path glob,
+parameter name and color predicates, then applies the same actions as the
+batch CLI (color, hdr_scale, scale, alpha) plus an optional hue shift:
+
+    [[rule]]
+    name = "creature glow"
+    path = "creatures/*_glow.xbm"      # glob on the path relative to the input folder
+    parameter = "IlluminationColor1"   # fnmatch on the parameter name (default)
+    when = { dominant = "blue", min_scale = 1.0 }
+    scale = 2.5
+
+JSON files use the same structure: {"rule": [{...}, ...]} or a bare list.
+Rules are compiled once and applied in file order; every matching rule is
+applied to the color left by the previous one.
+"""
+import colorsys
+import fnmatch
+import json
+import os
+import re
+
+from xbm_core import apply_color_rule, describe_color
+
+PREDICATE_KEYS = ('dominant', 'min_scale', 'max_scale', 'hue', 'min_saturation',
+                  'max_saturation', 'min_alpha', 'max_alpha')
+ACTION_KEYS = ('color', 'hdr_scale', 'scale', 'alpha', 'hue_shift')
+CHANNELS = {'red': 0, 'green': 1, 'blue': 2}
+
+
+class RuleError(ValueError):
+    """Raised for malformed rule files"""
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_numbers(value, count):
+    return isinstance(value, (list, tuple)) and len(value) == count and all(_is_number(v) for v in value)
+
+
+def shift_hue(rgba, degrees):
+    """Rotate the hue of an RGBA tuple, keeping saturation and HDR intensity"""
+    r, g, b, a = rgba
+    max_rgb = max(r, g, b)
+    if max_rgb <= 0:
+        return rgba
+    h, s, v = colorsys.rgb_to_hsv(max(r, 0) / max_rgb, max(g, 0) / max_rgb, max(b, 0) / max_rgb)
+    r, g, b = colorsys.hsv_to_rgb((h + degrees / 360.0) % 1.0, s, v)
+    return (r * max_rgb, g * max_rgb, b * max_rgb, a)
+
+
+class Rule:
+    """A single compiled rule"""
+
+    def __init__(self, spec, index=0):
+        if not isinstance(spec, dict):
+            raise RuleError(f"Rule {index}: expected a table of keys, got {type(spec).__name__}")
+        unknown = set(spec) - {'name', 'path', 'parameter', 'when'} - set(ACTION_KEYS)
+        if unknown:
+            raise RuleError(f"Rule {index}: unknown keys {', '.join(sorted(unknown))}")
+
+        self.name = spec.get('name', f"rule {index}")
+        if not isinstance(self.name, str):
+            raise RuleError(f"Rule {index}: name must be a string")
+        for key in ('path', 'parameter'):
+            if not isinstance(spec.get(key, ''), str):
+                raise RuleError(f"{self.name}: {key} must be a string")
+        self.path_pattern = spec.get('path', '*')
+        self.path_re = re.compile(fnmatch.translate(self.path_pattern.replace('\\', '/')), re.IGNORECASE)
+        self.parameter = spec.get('parameter', 'IlluminationColor1')
+
+        when = spec.get('when', {})
+        if not isinstance(when, dict):
+            raise RuleError(f"{self.name}: when must be a table of predicates")
+        self.when = dict(when)
+        unknown = set(self.when) - set(PREDICATE_KEYS)
+        if unknown:
+            raise RuleError(f"{self.name}: unknown predicates {', '.join(sorted(unknown))}")
+        dominant = self.when.get('dominant')
+        if dominant is not None and dominant not in CHANNELS:
+            raise RuleError(f"{self.name}: dominant must be red, green or blue")
+        hue = self.when.get('hue')
+        if hue is not None and not _is_numbers(hue, 2):
+            raise RuleError(f"{self.name}: hue must be [min, max] in degrees")
+        for key, value in self.when.items():
+            if key not in ('dominant', 'hue') and not _is_number(value):
+                raise RuleError(f"{self.name}: {key} must be a number")
+
+        self.actions = {key: spec[key] for key in ACTION_KEYS if key in spec}
+        if not self.actions:
+            raise RuleError(f"{self.name}: no action (use {', '.join(ACTION_KEYS)})")
+        for key, value in self.actions.items():
+            if key == 'color':
+                if not _is_numbers(value, 3):
+                    raise RuleError(f"{self.name}: color must be [r, g, b]")
+            elif not _is_number(value):
+                raise RuleError(f"{self.name}: {key} must be a number")
+
+    def matches_path(self, relpath):
+        return self.path_re.match(relpath.replace('\\', '/')) is not None
+
+    def matches_parameter(self, name):
+        return fnmatch.fnmatchcase(name, self.parameter)
+
+    def matches_color(self, rgba):
+        when = self.when
+        if not when:
+            return True
+        hdr_scale, hue, saturation = describe_color(rgba)
+
+        dominant = when.get('dominant')
+        if dominant is not None and rgba[CHANNELS[dominant]] < max(rgba[:3]):
+            return False
+        if 'min_scale' in when and hdr_scale < when['min_scale']:
+            return False
+        if 'max_scale' in when and hdr_scale > when['max_scale']:
+            return False
+        if 'min_saturation' in when and saturation < when['min_saturation']:
+            return False
+        if 'max_saturation' in when and saturation > when['max_saturation']:
+            return False
+        if 'min_alpha' in when and rgba[3] < when['min_alpha']:
+            return False
+        if 'max_alpha' in when and rgba[3] > when['max_alpha']:
+            return False
+        if 'hue' in when:
+            hue_min, hue_max = when['hue']
+            if hue_min <= hue_max:
+                if not hue_min <= hue <= hue_max:
+                    return False
+            elif hue_max < hue < hue_min:
+                return False
+        return True
+
+    def apply(self, rgba):
+        actions = self.actions
+        rgba = apply_color_rule(rgba, color=actions.get('color'), scale=actions.get('scale'),
+                                hdr_scale=actions.get('hdr_scale'), alpha=actions.get('alpha'))
+        if 'hue_shift' in actions:
+            rgba = shift_hue(rgba, actions['hue_shift'])
+        return rgba
+
+
+class RuleSet:
+    """Compiled rules evaluated against (relative path, parameter, RGBA)"""
+
+    def __init__(self, specs):
+        self.rules = [Rule(spec, i) for i, spec in enumerate(specs)]
+
+    def __len__(self):
+        return len(self.rules)
+
+    def rules_for_path(self, relpath):
+        """Rules whose path glob matches, so per-color evaluation skips the rest"""
+        return [rule for rule in self.rules if rule.matches_path(relpath)]
+
+    def evaluate(self, relpath, name, rgba, rules=None):
+        """Return the new RGBA, or None when no rule applies"""
+        changed = False
+        for rule in self.rules_for_path(relpath) if rules is None else rules:
+            if rule.matches_parameter(name) and rule.matches_color(rgba):
+                rgba = rule.apply(rgba)
+                changed = True
+        return tuple(rgba) if changed else None
+
+
+def load_rules(path):
+    """Load and compile a .json or .toml rules file"""
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext == '.toml':
+            try:
+                import tomllib
+            except ImportError:
+                try:
+                    import tomli as tomllib
+                except ImportError:
+                    raise RuleError(f"Cannot read rules file {path}: TOML rules need Python 3.11+ "
+                                    "or the tomli package (pip install tomli)")
+            with open(path, 'rb') as f:
+                data = tomllib.load(f)
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RuleError(f"Cannot read rules file {path}: {e}")
+
+    specs = data.get('rule', data.get('rules')) if isinstance(data, dict) else data
+    if not isinstance(specs, list) or not specs:
+        raise RuleError(f"{path}: expected a non-empty list of rules")
+    return RuleSet(specs)
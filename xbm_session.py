@@ -0,0 +1,165 @@
+"""Multi-document editing session.
+
+An EditorSession keeps every opened material as a Document holding its path,
+color offset, original RGBA and the RGBA being edited. File buffers are kept
+resident in least-recently-used order under a memory cap; when the cap is
+exceeded the oldest buffers are dropped and re-read on demand. Pending edits
+live on the Document rather than in the buffer, so eviction never loses them.
+"""
+import os
+from collections import OrderedDict
+
+from xbm_history import EditHistory
+
+DEFAULT_MEMORY_CAP = 256 * 1024 * 1024
+
+
+def document_key(path):
+    """Normalised path used to identify a document"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+class Document:
+    """One open material and its edit state (including its undo history)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.material = None
+        self.position = None
+        self.mtime_ns = None
+        self.original = None  # RGBA as read from the file
+        self.rgba = None      # RGBA being edited, written on save
+        self.history = EditHistory()
+
+    @property
+    def name(self):
+        return os.path.basename(self.path)
+
+    @property
+    def loaded(self):
+        return self.material is not None
+
+    @property
+    def size(self):
+        return self.material.size if self.material is not None else 0
+
+    @property
+    def dirty(self):
+        return self.rgba is not None and tuple(self.rgba) != tuple(self.original)
+
+    def attach(self, material):
+        """Take a freshly read buffer; edits survive unless the file changed on disk"""
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        changed = self.mtime_ns is not None and mtime_ns != self.mtime_ns
+
+        self.material = material
+        self.position = material.illumination_color_position
+        self.mtime_ns = mtime_ns
+        if material.has_color and (self.original is None or changed):
+            self.original = material.get_color()
+            if self.rgba is None or not changed:
+                self.rgba = self.original
+        return changed
+
+    def detach(self):
+        """Drop the buffer, keeping path, offset and colors"""
+        self.material = None
+
+    def mark_saved(self):
+        """The edited color is now what the file holds"""
+        self.original = self.rgba
+        try:
+            self.mtime_ns = os.stat(self.path).st_mtime_ns
+        except OSError:
+            pass
+
+
+class EditorSession:
+    """Open documents plus an LRU set of resident buffers under memory_cap bytes"""
+
+    def __init__(self, memory_cap=DEFAULT_MEMORY_CAP):
+        self.memory_cap = memory_cap
+        self.documents = OrderedDict()  # key -> Document, in open order
+        self._resident = OrderedDict()  # key -> Document with a buffer, least recent first
+        self.current = None
+        self.loads = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __iter__(self):
+        return iter(self.documents.values())
+
+    def __contains__(self, path):
+        return document_key(path) in self.documents
+
+    def get(self, path):
+        return self.documents.get(document_key(path))
+
+    def index(self, document):
+        return list(self.documents.values()).index(document)
+
+    @property
+    def resident_bytes(self):
+        return sum(doc.size for doc in self._resident.values())
+
+    @property
+    def resident_count(self):
+        return len(self._resident)
+
+    def open(self, path):
+        """Return the document for path, adding an unloaded one if needed"""
+        key = document_key(path)
+        document = self.documents.get(key)
+        if document is None:
+            document = self.documents[key] = Document(path)
+        return document
+
+    def attach(self, path, material):
+        """Register a buffer read for path (e.g. by a loader thread)"""
+        document = self.open(path)
+        document.attach(material)
+        self.loads += 1
+        self._touch(document)
+        return document
+
+    def activate(self, document):
+        """Make document current and most recently used"""
+        self.current = document
+        if document.loaded:
+            self._touch(document)
+
+    def close(self, document):
+        key = document_key(document.path)
+        self.documents.pop(key, None)
+        self._resident.pop(key, None)
+        document.detach()
+        if self.current is document:
+            self.current = None
+
+    def dirty_documents(self):
+        return [doc for doc in self.documents.values() if doc.dirty]
+
+    def _touch(self, document):
+        key = document_key(document.path)
+        self._resident[key] = document
+        self._resident.move_to_end(key)
+        self._evict(keep=document)
+
+    def _evict(self, keep=None):
+        """Drop least recently used buffers until under the cap (never keep or current)"""
+        total = self.resident_bytes
+        for key in list(self._resident):
+            if total <= self.memory_cap:
+                break
+            document = self._resident[key]
+            if document is keep or document is self.current:
+                continue
+            total -= document.size
+            del self._resident[key]
+            document.detach()
+            self.evictions += 1
@@ -0,0 +1,186 @@
+"""Vectorized color transforms for bulk recoloring (requires NumPy).
+
+Colors are held as an (N, 4) float32 array of raw RGBA values, one row per
+color parameter, and every operation works on the whole array at once.
+HDR values (channels above 1.0) are kept unless an operation clamps them.
+"""
+import numpy as np
+
+
+def to_array(colors):
+    """Build an (N, 4) float32 array from a sequence of RGBA tuples"""
+    return np.asarray(colors, dtype=np.float32).reshape(-1, 4)
+
+
+def hdr_scale(colors):
+    """Per-row HDR scale: max(r, g, b), floored at 1.0 like the editor's indicator"""
+    return np.maximum(colors[:, :3].max(axis=1), 1.0)
+
+
+def rgb_to_hsv(rgb):
+    """Vectorized RGB -> HSV; hue in [0, 1), value unbounded for HDR input"""
+    r, g, b = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+    v = rgb.max(axis=1)
+    delta = v - rgb.min(axis=1)
+    safe_delta = np.where(delta > 0, delta, 1.0)
+    s = np.where(v > 0, delta / np.where(v > 0, v, 1.0), 0.0)
+
+    h = np.where(v == r, (g - b) / safe_delta,
+                 np.where(v == g, 2.0 + (b - r) / safe_delta, 4.0 + (r - g) / safe_delta))
+    h = np.where(delta > 0, (h / 6.0) % 1.0, 0.0)
+    return np.stack([h, s, v], axis=1).astype(np.float32)
+
+
+def hsv_to_rgb(hsv):
+    """Vectorized HSV -> RGB (inverse of rgb_to_hsv)"""
+    h, s, v = hsv[:, 0], hsv[:, 1], hsv[:, 2]
+    i = np.floor(h * 6.0)
+    f = h * 6.0 - i
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+    i = i.astype(np.int64) % 6
+
+    r = np.choose(i, [v, q, p, p, t, v])
+    g = np.choose(i, [t, v, v, q, p, p])
+    b = np.choose(i, [p, p, t, v, v, q])
+    return np.stack([r, g, b], axis=1).astype(np.float32)
+
+
+def hue_shift(colors, degrees):
+    """Rotate the hue of every color, keeping saturation and HDR intensity"""
+    out = colors.copy()
+    hsv = rgb_to_hsv(colors[:, :3])
+    hsv[:, 0] = (hsv[:, 0] + degrees / 360.0) % 1.0
+    out[:, :3] = hsv_to_rgb(hsv)
+    return out
+
+
+def scale(colors, factor):
+    """Multiply RGB by factor"""
+    out = colors.copy()
+    out[:, :3] *= factor
+    return out
+
+
+def set_hdr_scale(colors, target):
+    """Rescale RGB so the brightest channel equals target (black rows are left alone)"""
+    out = colors.copy()
+    max_rgb = colors[:, :3].max(axis=1)
+    factor = np.where(max_rgb > 0, target / np.where(max_rgb > 0, max_rgb, 1.0), 1.0)
+    out[:, :3] *= factor[:, None]
+    return out
+
+
+def normalize(colors):
+    """Divide HDR rows by max(r, g, b) so they fit 0-1, like Manual Normalize"""
+    out = colors.copy()
+    max_rgb = colors[:, :3].max(axis=1)
+    factor = np.where(max_rgb > 1.0, max_rgb, 1.0)
+    out[:, :3] /= factor[:, None]
+    return out
+
+
+def clamp(colors, low=0.0, high=1.0):
+    """Clamp RGB into [low, high]"""
+    out = colors.copy()
+    np.clip(out[:, :3], low, high, out=out[:, :3])
+    return out
+
+
+def tint(colors, rgb, amount=1.0):
+    """Blend each color toward rgb scaled by the row's own brightness
+
+    amount=0 leaves colors unchanged, amount=1 replaces the hue with rgb
+    while keeping each row's HDR intensity.
+    """
+    out = colors.copy()
+    tint_rgb = np.asarray(rgb, dtype=np.float32)
+    tint_max = tint_rgb.max()
+    if tint_max > 0:
+        tint_rgb = tint_rgb / tint_max
+    target = tint_rgb[None, :] * colors[:, :3].max(axis=1)[:, None]
+    out[:, :3] = colors[:, :3] + (target - colors[:, :3]) * amount
+    return out
+
+
+def set_alpha(colors, alpha):
+    out = colors.copy()
+    out[:, 3] = alpha
+    return out
+
+
+OPERATIONS = {
+    'hue': hue_shift,
+    'scale': scale,
+    'hdr': set_hdr_scale,
+    'normalize': normalize,
+    'clamp': clamp,
+    'tint': tint,
+    'alpha': set_alpha,
+}
+
+# Argument kinds per operation: 'number' or 'rgb' (three comma-separated
+# numbers), then how many of the trailing arguments may be left out
+OPERATION_ARGS = {
+    'hue': (('number',), 0),
+    'scale': (('number',), 0),
+    'hdr': (('number',), 0),
+    'normalize': ((), 0),
+    'clamp': (('number', 'number'), 2),
+    'tint': (('rgb', 'number'), 0),
+    'alpha': (('number',), 0),
+}
+
+
+def _usage(name):
+    kinds, optional = OPERATION_ARGS[name]
+    parts = [name] + ['R,G,B' if kind == 'rgb' else 'N' for kind in kinds]
+    return ':'.join(parts) + (f" (last {optional} optional)" if optional else "")
+
+
+def parse_operation(spec):
+    """Parse 'name:arg:arg' into (function, args)
+
+    Examples: 'hue:30', 'scale:2.5', 'hdr:3', 'normalize', 'clamp:0:4',
+    'tint:1,0.5,0:0.3', 'alpha:1'. Comma-separated arguments become tuples.
+    """
+    name, *raw_args = spec.split(':')
+    if name not in OPERATIONS:
+        raise ValueError(f"Unknown transform '{name}' (choose from {', '.join(OPERATIONS)})")
+
+    kinds, optional = OPERATION_ARGS[name]
+    if not len(kinds) - optional <= len(raw_args) <= len(kinds):
+        raise ValueError(f"Transform '{spec}' should look like {_usage(name)}")
+
+    args = []
+    for kind, raw in zip(kinds, raw_args):
+        try:
+            values = tuple(float(v) for v in raw.split(','))
+        except ValueError:
+            raise ValueError(f"Transform '{spec}': '{raw}' is not a number")
+        if len(values) != (3 if kind == 'rgb' else 1):
+            raise ValueError(f"Transform '{spec}' should look like {_usage(name)}")
+        args.append(values if kind == 'rgb' else values[0])
+
+    if name == 'clamp' and len(args) == 2 and args[0] > args[1]:
+        raise ValueError(f"Transform '{spec}': low {args[0]:g} is above high {args[1]:g}")
+    if name == 'clamp' and len(args) == 1 and args[0] > 1.0:
+        raise ValueError(f"Transform '{spec}': low {args[0]:g} is above the default high 1")
+    return OPERATIONS[name], args
+
+
+class TransformPipeline:
+    """An ordered list of operations applied to an (N, 4) array in one pass each"""
+
+    def __init__(self, specs=()):
+        self.operations = [parse_operation(spec) for spec in specs]
+
+    def __bool__(self):
+        return bool(self.operations)
+
+    def apply(self, colors):
+        colors = to_array(colors)
+        for func, args in self.operations:
+            colors = func(colors, *args)
+        return colors
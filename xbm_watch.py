@@ -0,0 +1,239 @@
+"""Watch a directory tree and hand changed material files to a callback.
+
+Changes are picked up with inotify on Linux (through ctypes, no extra
+dependency) or by periodically comparing os.stat() snapshots elsewhere.
+Bursts of events are debounced: a file is only handed over once it has
+been quiet for the debounce delay, so a copy in progress is not processed
+half-written. Every file's (size, mtime, inode) stamp is remembered after
+it was handled, which filters out events caused by the handler's own
+writes and makes an inotify queue overflow a cheap rescan rather than a
+full re-run.
+"""
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import select
+import struct
+import time
+
+DEFAULT_DEBOUNCE = 0.5
+POLL_INTERVAL = 1.0
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+
+def file_stamp(path):
+    """(size, mtime_ns, inode) of path, or None if it is gone"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+def _excluded(path, exclude):
+    return exclude is not None and (path == exclude or path.startswith(exclude + os.sep))
+
+
+def _matches(name, pattern):
+    return fnmatch.fnmatch(name.lower(), pattern.lower())
+
+
+def snapshot(root, pattern="*.xbm", exclude=None):
+    """{path: stamp} of every matching file under root, skipping the exclude directory"""
+    stamps = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not _excluded(os.path.abspath(os.path.join(dirpath, d)), exclude)]
+        for name in filenames:
+            if _matches(name, pattern):
+                path = os.path.join(dirpath, name)
+                stamp = file_stamp(path)
+                if stamp is not None:
+                    stamps[path] = stamp
+    return stamps
+
+
+class PollingWatcher:
+    """Finds changes by comparing stat snapshots every interval seconds"""
+
+    name = 'polling'
+
+    def __init__(self, root, pattern="*.xbm", exclude=None, interval=POLL_INTERVAL):
+        self.root = root
+        self.pattern = pattern
+        self.exclude = exclude
+        self.interval = interval
+        self._stamps = snapshot(root, pattern, exclude)
+        self._next_scan = time.monotonic() + interval
+
+    def poll(self, timeout=None):
+        """Wait up to timeout seconds (None: until the next scan) and return changed paths"""
+        now = time.monotonic()
+        wait = self._next_scan - now
+        if timeout is not None and timeout < wait:
+            time.sleep(max(0.0, timeout))
+            return []
+        time.sleep(max(0.0, wait))
+        self._next_scan = time.monotonic() + self.interval
+
+        stamps = snapshot(self.root, self.pattern, self.exclude)
+        changed = [path for path, stamp in stamps.items() if self._stamps.get(path) != stamp]
+        changed.extend(path for path in self._stamps if path not in stamps)
+        self._stamps = stamps
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Linux inotify watches on every directory under root
+
+    Raises OSError when inotify is unavailable (other platforms, or the
+    per-user watch limit is reached); use open_watcher to fall back to polling.
+    """
+
+    name = 'inotify'
+
+    def __init__(self, root, pattern="*.xbm", exclude=None):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError("C library not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError("inotify is not available on this platform")
+
+        self.root = root
+        self.pattern = pattern
+        self.exclude = exclude
+        self._dirs = {}  # wd -> directory path
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        try:
+            self._watch_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def _watch_tree(self, top):
+        """Watch top and its subdirectories; return the matching files already inside"""
+        found = []
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames[:] = [d for d in dirnames if not _excluded(os.path.abspath(os.path.join(dirpath, d)), self.exclude)]
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, f"cannot watch {dirpath}: {os.strerror(errno)}")
+            self._dirs[wd] = dirpath
+            found.extend(os.path.join(dirpath, name) for name in filenames if _matches(name, self.pattern))
+        return found
+
+    def poll(self, timeout=None):
+        """Wait up to timeout seconds (None: indefinitely) and return changed paths"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        changed = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost; report everything and let the stamps sort it out
+                changed.extend(snapshot(self.root, self.pattern, self.exclude))
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not _excluded(os.path.abspath(path), self.exclude):
+                    # Files copied in before the new directory was watched count as changed
+                    try:
+                        changed.extend(self._watch_tree(path))
+                    except OSError:
+                        pass
+            elif _matches(name, self.pattern):
+                changed.append(path)
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def open_watcher(root, pattern="*.xbm", exclude=None, use_inotify=True, interval=POLL_INTERVAL):
+    """An InotifyWatcher where possible, otherwise a PollingWatcher"""
+    if exclude is not None:
+        exclude = os.path.abspath(exclude)
+    if use_inotify:
+        try:
+            return InotifyWatcher(root, pattern, exclude)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(root, pattern, exclude, interval)
+
+
+def watch(watcher, handle, debounce=DEFAULT_DEBOUNCE, stop=None):
+    """Call handle(paths) with batches of changed files until stop() is true
+
+    A file joins a batch once no event has touched it for debounce seconds
+    and its stamp differs from when it was last handled (or from startup),
+    so files already in the tree are left alone until they change. Stamps
+    are taken again after handle returns, so the handler's own in-place
+    writes do not trigger another round.
+    """
+    stamps = snapshot(watcher.root, watcher.pattern, watcher.exclude)
+    pending = {}  # path -> time of its latest event
+
+    while stop is None or not stop():
+        if pending:
+            timeout = max(0.0, min(pending.values()) + debounce - time.monotonic())
+        else:
+            timeout = POLL_INTERVAL if stop is not None else None
+        for path in watcher.poll(timeout):
+            pending[path] = time.monotonic()
+
+        now = time.monotonic()
+        ready = [path for path, stamp_time in pending.items() if now - stamp_time >= debounce]
+        batch = []
+        for path in ready:
+            del pending[path]
+            stamp = file_stamp(path)
+            if stamp is None:
+                stamps.pop(path, None)
+            elif stamp != stamps.get(path):
+                batch.append(path)
+        if batch:
+            batch.sort()
+            handle(batch)
+            for path in batch:
+                stamps[path] = file_stamp(path)
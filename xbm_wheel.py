@@ -0,0 +1,153 @@
+"""Inline HSV color wheel widget (requires NumPy).
+
+A hue/saturation disc next to a value strip, picked by clicking or
+dragging. The disc at full value is computed once per size; the image for
+a given value is that buffer scaled and blended over the background, and
+is cached per 8-bit value step, so dragging only re-renders the disc when
+the value actually changes. The strip depends on hue and saturation and is
+small enough to redraw on every pick.
+"""
+import colorsys
+import math
+import tkinter as tk
+from functools import lru_cache
+
+import numpy as np
+
+from xbm_preview import to_ppm
+
+VALUE_STEPS = 256
+STRIP_WIDTH = 18
+
+
+def hsv_to_rgb(h, s, v):
+    """Vectorized HSV -> RGB for arrays of h (0-1), s and v; returns (..., 3)"""
+    h6 = np.asarray(h) * 6.0
+    s = np.asarray(s)[..., None]
+    v = np.asarray(v)[..., None]
+    k = (np.array([5.0, 3.0, 1.0]) + h6[..., None]) % 6.0
+    return v - v * s * np.clip(np.minimum(k, 4.0 - k), 0.0, 1.0)
+
+
+def _hex_to_rgb(color):
+    return tuple(int(color[i:i + 2], 16) for i in (1, 3, 5))
+
+
+@lru_cache(maxsize=4)
+def _wheel_geometry(size):
+    """Full-value disc colors and anti-aliased coverage for a size x size wheel"""
+    radius = size / 2.0
+    ys, xs = np.mgrid[0:size, 0:size].astype(np.float32)
+    dx = xs + 0.5 - radius
+    dy = radius - (ys + 0.5)  # Screen y points down; hue runs counter-clockwise
+    distance = np.hypot(dx, dy)
+
+    hue = (np.arctan2(dy, dx) / (2.0 * np.pi)) % 1.0
+    saturation = np.clip(distance / (radius - 1.0), 0.0, 1.0)
+    colors = hsv_to_rgb(hue, saturation, 1.0).astype(np.float32) * 255.0
+    coverage = np.clip(radius - distance, 0.0, 1.0)[..., None].astype(np.float32)
+    return colors, coverage
+
+
+@lru_cache(maxsize=64)
+def wheel_ppm(size, value_step, background):
+    """PPM data for the disc at value value_step / (VALUE_STEPS - 1) over an RGB background"""
+    colors, coverage = _wheel_geometry(size)
+    value = value_step / (VALUE_STEPS - 1)
+    pixels = np.asarray(background, dtype=np.float32) * (1.0 - coverage) + colors * (value * coverage)
+    return to_ppm((pixels + 0.5).astype(np.uint8))
+
+
+def strip_ppm(width, height, hue, saturation):
+    """PPM data for a vertical value gradient (full value at the top) of one hue/saturation"""
+    values = np.linspace(1.0, 0.0, height)
+    column = hsv_to_rgb(np.full(height, hue), np.full(height, saturation), values)
+    pixels = np.repeat((column * 255.0 + 0.5).astype(np.uint8)[:, None, :], width, axis=1)
+    return to_ppm(pixels)
+
+
+class ColorWheel(tk.Frame):
+    """Hue/saturation wheel plus value strip; command(r, g, b) gets 0-1 picks live"""
+
+    def __init__(self, master, size=160, command=None, bg='#3a3a3a'):
+        super().__init__(master, bg=bg)
+        self.size = size
+        self.command = command
+        self.background = _hex_to_rgb(bg)
+        self.hue, self.saturation, self.value = 0.0, 0.0, 1.0
+        self._shown_step = None
+        self._shown_strip = None
+
+        self.wheel_canvas = tk.Canvas(self, width=size, height=size, bg=bg,
+                                      highlightthickness=0, cursor='crosshair')
+        self.wheel_canvas.pack(side=tk.LEFT)
+        self.wheel_photo = tk.PhotoImage(width=size, height=size)
+        self.wheel_canvas.create_image(0, 0, anchor=tk.NW, image=self.wheel_photo)
+        self.wheel_marker = self.wheel_canvas.create_oval(0, 0, 0, 0, outline='white', width=2)
+
+        self.strip_canvas = tk.Canvas(self, width=STRIP_WIDTH, height=size, bg=bg,
+                                      highlightthickness=1, highlightbackground='#666666',
+                                      cursor='sb_v_double_arrow')
+        self.strip_canvas.pack(side=tk.LEFT, padx=(10, 0))
+        self.strip_photo = tk.PhotoImage(width=STRIP_WIDTH, height=size)
+        self.strip_canvas.create_image(0, 0, anchor=tk.NW, image=self.strip_photo)
+        self.strip_marker = self.strip_canvas.create_rectangle(0, 0, 0, 0, outline='white', width=2)
+
+        for sequence in ('<Button-1>', '<B1-Motion>'):
+            self.wheel_canvas.bind(sequence, self._pick_wheel)
+            self.strip_canvas.bind(sequence, self._pick_value)
+
+        self._redraw()
+
+    def get_rgb(self):
+        return colorsys.hsv_to_rgb(self.hue, self.saturation, self.value)
+
+    def set_rgb(self, r, g, b):
+        """Show a 0-1 color without calling command; hue/saturation are kept where undefined"""
+        h, s, v = colorsys.rgb_to_hsv(*(max(0.0, min(1.0, c)) for c in (r, g, b)))
+        if v > 0:
+            if s > 0:
+                self.hue = h
+            self.saturation = s
+        self.value = v
+        self._redraw()
+
+    def _pick_wheel(self, event):
+        radius = self.size / 2.0
+        dx, dy = event.x - radius, radius - event.y
+        self.hue = (math.atan2(dy, dx) / (2.0 * math.pi)) % 1.0
+        self.saturation = min(1.0, math.hypot(dx, dy) / (radius - 1.0))
+        self._picked()
+
+    def _pick_value(self, event):
+        self.value = max(0.0, min(1.0, 1.0 - event.y / (self.size - 1)))
+        self._picked()
+
+    def _picked(self):
+        self._redraw()
+        if self.command:
+            self.command(*self.get_rgb())
+
+    def _redraw(self):
+        """Update the images (only when their inputs changed) and move the markers"""
+        step = int(round(self.value * (VALUE_STEPS - 1)))
+        if step != self._shown_step:
+            self._shown_step = step
+            self.wheel_photo.configure(data=wheel_ppm(self.size, step, self.background), format='PPM')
+
+        strip_key = (self.hue, self.saturation)
+        if strip_key != self._shown_strip:
+            self._shown_strip = strip_key
+            self.strip_photo.configure(data=strip_ppm(STRIP_WIDTH, self.size, self.hue, self.saturation),
+                                       format='PPM')
+
+        radius = self.size / 2.0
+        angle = self.hue * 2.0 * math.pi
+        x = radius + math.cos(angle) * self.saturation * (radius - 1.0)
+        y = radius - math.sin(angle) * self.saturation * (radius - 1.0)
+        outline = 'black' if self.value > 0.6 else 'white'
+        self.wheel_canvas.coords(self.wheel_marker, x - 5, y - 5, x + 5, y + 5)
+        self.wheel_canvas.itemconfig(self.wheel_marker, outline=outline)
+
+        y = (1.0 - self.value) * (self.size - 1)
+        self.strip_canvas.coords(self.strip_marker, 1, y - 2, STRIP_WIDTH - 1, y + 2)